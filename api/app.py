@@ -4,24 +4,84 @@ import os
 
 # Adds the project root (one level up) to the top of sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from fastapi import FastAPI
-from core.state import get_state
+import threading
+from contextlib import asynccontextmanager
+import time
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from core.state import DEFAULT_SYMBOL, state_cache
+from core.metrics import METRICS_ENABLED, METRICS_FILE, registry
+from api.stream import broadcaster, event_stream
 
-app = FastAPI(title="Crypto Regime Service")
+# load the model in a background thread at startup (REGIME_API_WARMUP=1)
+API_WARMUP = os.getenv("REGIME_API_WARMUP", "0") == "1"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if API_WARMUP:
+        from core.predictor import warm_up
+        threading.Thread(target=warm_up, name="predictor-warmup", daemon=True).start()
+    yield
+
+app = FastAPI(title="Crypto Regime Service", lifespan=lifespan)
+
+REQUEST_METRIC = "regime_api_request_seconds"
+request_seconds = registry.histogram(REQUEST_METRIC, "API request handling time in seconds")
+
+if METRICS_ENABLED:
+    @app.middleware("http")
+    async def time_requests(request: Request, call_next):
+        start = time.perf_counter()
+        response = await call_next(request)
+        # label by route template, not raw path, to keep cardinality bounded
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        request_seconds.observe(time.perf_counter() - start, path=path, status=str(response.status_code))
+        return response
+
+def _json(body: bytes) -> Response:
+    return Response(content=body, media_type="application/json")
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 @app.get("/current-regime")
-def current_regime():
-    return get_state()
+def current_regime(symbol: str = DEFAULT_SYMBOL):
+    return _json(state_cache.state_body(symbol.upper()))
+
+@app.get("/regimes")
+def all_regimes():
+    return _json(state_cache.all_states_body())
 
 @app.get("/alerts")
-def get_alerts():
-    state = get_state()
-    return {
-        "timestamp": state.get("timestamp"),
-        "alerts": state.get("alerts", [])
-    }
+def get_alerts(symbol: str = DEFAULT_SYMBOL):
+    return _json(state_cache.alerts_body(symbol.upper()))
+
+@app.get("/stream")
+async def stream(request: Request, symbols: str = ""):
+    """
+    Server-Sent Events: one `regime` event per symbol whenever the worker
+    publishes a new state (alerts included), current state first.
+    `?symbols=BTCUSDT,ETHUSDT` limits the stream to those symbols.
+    """
+    wanted = [s.strip().upper() for s in symbols.split(",") if s.strip()]
+    try:
+        sub = broadcaster.subscribe(wanted or None)
+    except OverflowError:
+        raise HTTPException(status_code=503, detail="Too many stream subscribers")
+    return StreamingResponse(
+        event_stream(sub, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
+@app.get("/metrics")
+def metrics():
+    # worker histograms (written by the worker each cycle) + this process' request timings
+    try:
+        worker = METRICS_FILE.read_text()
+    except OSError:
+        worker = ""
+    body = worker + registry.render(prefix="regime_api_")
+    return Response(content=body, media_type="text/plain; version=0.0.4")
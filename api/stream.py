@@ -0,0 +1,131 @@
+# api/stream.py
+"""
+Server-Sent Events fan-out of published regime states.
+
+One background task watches the state cache; when the worker publishes, it
+serializes each changed symbol's state once and hands the bytes to every
+subscriber filtering on that symbol. Each subscriber buffers at most the
+latest event per symbol, so a slow client skips intermediate states
+instead of growing a queue; states are full snapshots, so the newest one
+supersedes the others.
+"""
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Set
+
+from core.state import state_cache
+
+# how often the broadcaster checks for a new state file (seconds)
+STREAM_POLL_INTERVAL = float(os.getenv("STREAM_POLL_INTERVAL", "0.5"))
+# comment line sent to idle clients so proxies keep the connection open
+STREAM_HEARTBEAT_SECONDS = 15.0
+STREAM_MAX_SUBSCRIBERS = int(os.getenv("STREAM_MAX_SUBSCRIBERS", "10000"))
+
+
+def _event(body: bytes, version: int) -> bytes:
+    return b"id: %d\nevent: regime\ndata: %s\n\n" % (version, body)
+
+
+class Subscriber:
+    def __init__(self, symbols: Optional[Set[str]]):
+        self.symbols = symbols  # None = every symbol
+        self._pending: "OrderedDict[str, bytes]" = OrderedDict()
+        self._ready = asyncio.Event()
+        self.skipped = 0
+
+    def wants(self, symbol: str) -> bool:
+        return self.symbols is None or symbol in self.symbols
+
+    def push(self, symbol: str, event: bytes):
+        if symbol in self._pending:
+            # client hasn't read the previous state yet: keep only the newest
+            self.skipped += 1
+            del self._pending[symbol]
+        self._pending[symbol] = event
+        self._ready.set()
+
+    async def next_events(self, timeout: float) -> bytes:
+        """Everything buffered, or b"" after `timeout` seconds with nothing new."""
+        if not self._pending:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return b""
+        out = b"".join(self._pending.values())
+        self._pending.clear()
+        return out
+
+
+class StateBroadcaster:
+    def __init__(self, poll_interval: float = STREAM_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self.subscribers: Set[Subscriber] = set()
+        self._bodies: Dict[str, bytes] = {}
+        self._version = None
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, symbols: Optional[Iterable[str]]) -> Subscriber:
+        if len(self.subscribers) >= STREAM_MAX_SUBSCRIBERS:
+            raise OverflowError("too many stream subscribers")
+        if self._task is None or self._task.done():
+            self._snapshot()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+        sub = Subscriber(set(symbols) if symbols else None)
+        # start every client off with the current state of its symbols
+        for symbol, body in self._bodies.items():
+            if sub.wants(symbol):
+                sub.push(symbol, _event(body, self._version))
+        self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self.subscribers.discard(sub)
+
+    def _snapshot(self) -> Dict[str, bytes]:
+        """Refresh per-symbol bodies; returns the symbols whose state changed."""
+        states = state_cache.states()
+        self._version = state_cache.version
+        bodies = {symbol: state_cache.state_body(symbol) for symbol in states}
+        changed = {s: body for s, body in bodies.items() if self._bodies.get(s) != body}
+        self._bodies = bodies
+        return changed
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if not self.subscribers:
+                continue
+            state_cache.refresh()
+            if state_cache.version == self._version:
+                continue
+            try:
+                changed = self._snapshot()
+            except Exception as e:
+                print("[StateBroadcaster] Snapshot failed:", e)
+                continue
+            for symbol, body in changed.items():
+                event = _event(body, self._version)
+                for sub in list(self.subscribers):
+                    if sub.wants(symbol):
+                        sub.push(symbol, event)
+
+
+broadcaster = StateBroadcaster()
+
+
+async def event_stream(sub: Subscriber, is_disconnected):
+    """Body iterator for a StreamingResponse."""
+    try:
+        yield b"retry: 5000\n\n"
+        while True:
+            chunk = await sub.next_events(STREAM_HEARTBEAT_SECONDS)
+            if not chunk:
+                if await is_disconnected():
+                    break
+                chunk = b": ping\n\n"
+            yield chunk
+    finally:
+        broadcaster.unsubscribe(sub)
@@ -0,0 +1,74 @@
+# bench/fixtures.py
+"""
+Deterministic synthetic inputs for the benchmarks (no network, no files).
+Shapes and column names follow what the live code paths receive.
+"""
+import numpy as np
+import pandas as pd
+
+FIXTURE_SEED = 7
+# 2023-11-14 22:15 UTC, aligned to a 15m boundary
+START_MS = 1_700_000_100_000 // 900_000 * 900_000
+
+
+def ohlcv_5m_15m(n_5m: int, seed: int = FIXTURE_SEED):
+    """fetch_klines-style 5m frame and the 15m frame resampled from it."""
+    rng = np.random.default_rng(seed)
+    ts = START_MS + np.arange(n_5m, dtype=np.int64) * 300_000
+    close = 30_000 * np.exp(np.cumsum(rng.normal(0, 0.002, n_5m)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.002, n_5m))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.002, n_5m))
+    volume = rng.lognormal(3, 1, n_5m)
+
+    df_5m = pd.DataFrame({
+        "timestamp": pd.to_datetime(ts, unit="ms", utc=True),
+        "open": open_, "high": high, "low": low, "close": close, "volume": volume,
+    })
+    df_15m = (
+        df_5m.groupby(ts // 900_000)
+        .agg(
+            timestamp=("timestamp", "first"), open=("open", "first"), high=("high", "max"),
+            low=("low", "min"), close=("close", "last"), volume=("volume", "sum"),
+        )
+        .reset_index(drop=True)
+    )
+    return df_5m, df_15m
+
+
+def aggtrades(n_trades: int, seed: int = FIXTURE_SEED) -> pd.DataFrame:
+    """Binance aggTrades-like rows, ~5 trades/second, string prices like the raw feed."""
+    rng = np.random.default_rng(seed)
+    ts = START_MS + np.cumsum(rng.exponential(200, n_trades)).astype(np.int64)
+    price = 30_000 * np.exp(np.cumsum(rng.normal(0, 1e-4, n_trades)))
+    qty = rng.exponential(0.1, n_trades)
+    return pd.DataFrame({
+        "timestamp": pd.to_datetime(ts, unit="ms", utc=True),
+        "p": np.round(price, 2).astype(str),
+        "q": qty,
+        "taker_buy_vol": np.where(rng.random(n_trades) < 0.5, qty, 0.0),
+    })
+
+
+def depth_snapshots(n_snapshots: int, levels: int = 100, seed: int = FIXTURE_SEED) -> pd.DataFrame:
+    """Order book snapshots every ~30s with `levels` [price, qty] pairs per side."""
+    rng = np.random.default_rng(seed)
+    ts = START_MS + np.cumsum(rng.integers(20_000, 40_000, n_snapshots))
+    mids = 30_000 * np.exp(np.cumsum(rng.normal(0, 5e-4, n_snapshots)))
+    bids, asks = [], []
+    for mid in mids:
+        bid_px = mid - np.cumsum(rng.uniform(0.01, 2.0, levels))
+        ask_px = mid + np.cumsum(rng.uniform(0.01, 2.0, levels))
+        bids.append(np.column_stack([bid_px, rng.uniform(0, 3, levels)]).tolist())
+        asks.append(np.column_stack([ask_px, rng.uniform(0, 3, levels)]).tolist())
+    return pd.DataFrame({
+        "timestamp": pd.to_datetime(ts, unit="ms", utc=True),
+        "bids": bids,
+        "asks": asks,
+    })
+
+
+def feature_windows(n: int, time_steps: int, n_features: int, seed: int = FIXTURE_SEED) -> np.ndarray:
+    """Random model-input windows, (n, time_steps, n_features) float32."""
+    rng = np.random.default_rng(seed)
+    return rng.normal(0, 1, (n, time_steps, n_features)).astype(np.float32)
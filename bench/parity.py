@@ -0,0 +1,166 @@
+# bench/parity.py
+"""
+Checks the fast feature paths against the build_features reference.
+
+- streaming: slides a KLINE_WINDOW-bar window over synthetic history one
+  5m bar at a time, as the live worker does, and compares each
+  StreamingFeatureEngine window with build_lstm_input on the same rows
+  under FEATURE_RTOL/FEATURE_ATOL;
+- matrix: build_feature_matrix and build_lstm_input must equal
+  build_features(...).dropna() exactly, including when a column the model
+  doesn't use holds a NaN;
+- merge: merge_timeframes must match pd.merge_asof on aligned, offset and
+  empty 15m frames, and suffix a context column whose name is taken.
+
+    python -m bench.parity                # 500 windows
+    python -m bench.parity --steps 2000
+
+Exits with status 1 if any check fails.
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from bench import fixtures
+
+KLINE_WINDOW = 300
+
+
+def check_parity(steps: int, window: int = KLINE_WINDOW, seed: int = fixtures.FIXTURE_SEED) -> dict:
+    """Largest streaming-vs-batch differences over `steps` sliding windows."""
+    from core.data_fetcher import merge_timeframes
+    from core.feature_engineering import build_lstm_input
+    from core.incremental_features import FEATURE_ATOL, FEATURE_RTOL, StreamingFeatureEngine
+    from core.predictor import load_metadata
+
+    meta = load_metadata()
+    features, time_steps = meta["features"], meta["time_steps"]
+    merged = merge_timeframes(*fixtures.ohlcv_5m_15m(window + steps, seed))
+    engine = StreamingFeatureEngine(features, time_steps, main_tf="5m", context_tfs=["15m"])
+
+    max_abs = np.zeros(len(features))
+    max_rel = np.zeros(len(features))
+    failures = []
+    for start in range(steps):
+        rows = merged.iloc[start:start + window]
+        streamed = engine.update(rows).astype(np.float64)
+        batch = build_lstm_input(rows, features, time_steps, dtype=np.float64)
+
+        diff = np.abs(streamed - batch)
+        max_abs = np.maximum(max_abs, diff.max(axis=0))
+        max_rel = np.maximum(max_rel, (diff / np.maximum(np.abs(batch), np.finfo(float).tiny)).max(axis=0))
+        if not np.allclose(streamed, batch, rtol=FEATURE_RTOL, atol=FEATURE_ATOL):
+            failures.append(start)
+
+    return {
+        "windows": steps,
+        "rtol": FEATURE_RTOL,
+        "atol": FEATURE_ATOL,
+        "max_abs": dict(zip(features, max_abs.tolist())),
+        "max_rel": dict(zip(features, max_rel.tolist())),
+        "failures": failures,
+    }
+
+
+def _merge_asof(df_5m, df_15m):
+    # the alignment merge_timeframes replaced
+    fields = ["open", "high", "low", "close", "volume"]
+    return pd.merge_asof(
+        df_5m.rename(columns={c: f"{c}_5m" for c in fields}),
+        df_15m.rename(columns={c: f"{c}_15m" for c in fields}),
+        on="timestamp",
+        direction="backward",
+    )
+
+
+def check_merge(n_bars: int = 1_000, seed: int = fixtures.FIXTURE_SEED) -> list:
+    """Names of the merge_timeframes cases that don't match the reference."""
+    from core.data_fetcher import merge_timeframes
+
+    df_5m, df_15m = fixtures.ohlcv_5m_15m(n_bars, seed)
+    cases = {
+        "aligned": df_15m,
+        "offset grid": df_15m.assign(timestamp=(df_15m["timestamp"] + pd.Timedelta(minutes=5)).dt.as_unit("ms")),
+        "empty": df_15m.iloc[:0],
+    }
+    failures = []
+    for name, ctx in cases.items():
+        try:
+            pd.testing.assert_frame_equal(merge_timeframes(df_5m, ctx), _merge_asof(df_5m, ctx), check_dtype=False)
+        except (AssertionError, IndexError, ValueError):
+            failures.append(name)
+
+    # a shared extra column: the context one gets the _15m suffix
+    merged = merge_timeframes(df_5m.assign(trades=1.0), df_15m.assign(trades=2.0))
+    if merged.columns.duplicated().any() or not (
+        (merged["trades"] == 1.0).all() and (merged["trades_15m"].dropna() == 2.0).all()
+    ):
+        failures.append("shared column")
+    return failures
+
+
+def check_feature_matrix(n_bars: int = 1_000, seed: int = fixtures.FIXTURE_SEED) -> list:
+    """Names of the NaN cases where the matrix path drops other rows than build_features."""
+    from core.compute_features import build_feature_matrix, build_features
+    from core.data_fetcher import merge_timeframes
+    from core.feature_engineering import build_lstm_input
+    from core.predictor import load_metadata
+
+    meta = load_metadata()
+    features, time_steps = meta["features"], meta["time_steps"]
+    merged = merge_timeframes(*fixtures.ohlcv_5m_15m(n_bars, seed))
+
+    cases = {"clean": {}}
+    # inputs the model features don't read
+    for col in ("volume_5m", "volume_15m"):
+        cases[f"nan {col}"] = {col: n_bars // 2}
+    cases["nan extra column"] = {"extra": n_bars // 2}
+    cases["nan extra context column"] = {"extra_15m": n_bars // 2}
+
+    failures = []
+    for name, nans in cases.items():
+        df = merged.copy()
+        for col, row in nans.items():
+            if col not in df.columns:
+                df[col] = 1.0
+            df.loc[row, col] = np.nan
+        expected = build_features(df, main_tf="5m", context_tfs=["15m"], dropna=True)[features]
+        expected = expected.to_numpy(dtype=np.float32)
+        matrix = build_feature_matrix(df, features, main_tf="5m", context_tfs=["15m"]).to_numpy()
+        window = build_lstm_input(df, features, time_steps)
+        if not (np.array_equal(matrix, expected) and np.array_equal(window, expected[-time_steps:])):
+            failures.append(name)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the fast feature paths with build_features")
+    parser.add_argument("--steps", type=int, default=500, help="number of sliding windows")
+    parser.add_argument("--window", type=int, default=KLINE_WINDOW, help="bars per window")
+    parser.add_argument("--seed", type=int, default=fixtures.FIXTURE_SEED)
+    args = parser.parse_args()
+
+    merge_failures = check_merge(seed=args.seed)
+    print(f"merge_timeframes vs merge_asof: {'mismatch in ' + ', '.join(merge_failures) if merge_failures else 'identical'}")
+    matrix_failures = check_feature_matrix(seed=args.seed)
+    print(f"feature matrix vs build_features: {'mismatch in ' + ', '.join(matrix_failures) if matrix_failures else 'identical'}")
+
+    report = check_parity(args.steps, args.window, args.seed)
+    for name in report["max_abs"]:
+        print(f"{name:<28} max abs {report['max_abs'][name]:10.3e}  max rel {report['max_rel'][name]:10.3e}")
+
+    failures = report["failures"]
+    print(
+        f"{report['windows'] - len(failures)}/{report['windows']} windows within "
+        f"rtol={report['rtol']:g} atol={report['atol']:g}"
+    )
+    if failures:
+        print(f"Out of tolerance at window offsets {failures[:10]}{' ...' if len(failures) > 10 else ''}")
+    if failures or merge_failures or matrix_failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
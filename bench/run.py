@@ -0,0 +1,220 @@
+# bench/run.py
+"""
+Benchmarks for the feature and inference hot paths on synthetic fixtures.
+
+    python -m bench.run                         # full sizes, writes bench_results.json
+    python -m bench.run --quick                 # smallest size of each case
+    python -m bench.run --only build_features,robust_zscore
+    python -m bench.run --save-baseline         # store results as the baseline
+    python -m bench.run --compare               # flag cases slower than the baseline
+
+Each case is timed over --repeat runs after one warm-up run; peak memory
+comes from one extra run under tracemalloc. A case regresses when its
+median is more than --threshold (fraction) above the baseline median;
+--compare exits with status 1 if any case regressed.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from bench import fixtures
+
+DEFAULT_OUT = Path("bench_results.json")
+DEFAULT_BASELINE = Path("bench") / "baseline.json"
+
+
+class Case(NamedTuple):
+    name: str
+    size: int
+    unit: str        # what `size` counts, for throughput
+    setup: Callable  # () -> args tuple, not timed
+    run: Callable    # (*args) -> anything
+
+
+# -------------------------
+# Cases
+# -------------------------
+def _cases(quick: bool) -> List[Case]:
+    from core.compute_features import (
+        aggregate_aggtrades_to_5m,
+        aggregate_depth_snapshot_to_5m,
+        build_features,
+        robust_zscore,
+    )
+    from core.data_fetcher import merge_timeframes
+    from core.feature_engineering import build_lstm_input
+    from core.predictor import get_predictor, load_metadata
+
+    meta = load_metadata()
+    features, time_steps = meta["features"], meta["time_steps"]
+
+    def sizes(*values):
+        return values[:1] if quick else values
+
+    def merged(n):
+        return merge_timeframes(*fixtures.ohlcv_5m_15m(n))
+
+    cases = []
+    for n in sizes(500, 5_000, 20_000):
+        cases.append(Case("merge_timeframes", n, "bars", lambda n=n: fixtures.ohlcv_5m_15m(n), merge_timeframes))
+        cases.append(Case("build_features", n, "bars", lambda n=n: (merged(n),), build_features))
+        cases.append(Case(
+            "robust_zscore", n, "bars",
+            lambda n=n: (fixtures.ohlcv_5m_15m(n)[0]["volume"],),
+            robust_zscore,
+        ))
+    for n in sizes(300, 1_000):
+        cases.append(Case(
+            "build_lstm_input", n, "bars",
+            lambda n=n: (merged(n), features, time_steps),
+            build_lstm_input,
+        ))
+    for n in sizes(10_000, 100_000, 500_000):
+        cases.append(Case("aggregate_aggtrades_to_5m", n, "trades", lambda n=n: (fixtures.aggtrades(n),), aggregate_aggtrades_to_5m))
+    for n in sizes(200, 1_000):
+        cases.append(Case(
+            "aggregate_depth_snapshot_to_5m", n, "snapshots",
+            lambda n=n: (fixtures.depth_snapshots(n),),
+            aggregate_depth_snapshot_to_5m,
+        ))
+
+    predictor = get_predictor()
+    cases.append(Case(
+        "predict", 1, "windows",
+        lambda: (fixtures.feature_windows(1, time_steps, len(features))[0],),
+        predictor.predict,
+    ))
+    for n in sizes(8, 64):
+        cases.append(Case(
+            "predict_batch", n, "windows",
+            lambda n=n: (fixtures.feature_windows(n, time_steps, len(features)),),
+            predictor.predict_batch,
+        ))
+    for n in sizes(1_000, 10_000):
+        cases.append(Case(
+            "predict_series", n, "bars",
+            lambda n=n: (fixtures.feature_windows(1, n, len(features))[0],),
+            predictor.predict_series,
+        ))
+    return cases
+
+
+# -------------------------
+# Measurement
+# -------------------------
+def measure(case: Case, repeat: int) -> Dict:
+    args = case.setup()
+    case.run(*args)  # warm-up
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        case.run(*args)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        case.run(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    median = statistics.median(times)
+    return {
+        "name": case.name,
+        "size": case.size,
+        "unit": case.unit,
+        "repeat": repeat,
+        "median_s": median,
+        "min_s": min(times),
+        "max_s": max(times),
+        "throughput_per_s": case.size / median if median > 0 else None,
+        "peak_mem_mb": peak / 2**20,
+    }
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    regressions = []
+    for key, res in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        ratio = res["median_s"] / base["median_s"] if base["median_s"] > 0 else float("inf")
+        res["baseline_median_s"] = base["median_s"]
+        res["ratio"] = ratio
+        if ratio > 1 + threshold:
+            regressions.append(f"{key}: {ratio:.2f}x baseline ({res['median_s']*1e3:.2f} ms vs {base['median_s']*1e3:.2f} ms)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark feature and inference hot paths")
+    parser.add_argument("--quick", action="store_true", help="only the smallest size of each case")
+    parser.add_argument("--only", default="", help="comma-separated case names")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", type=Path, default=DEFAULT_OUT)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown vs baseline (fraction)")
+    args = parser.parse_args()
+
+    only = {name.strip() for name in args.only.split(",") if name.strip()}
+    cases = [c for c in _cases(args.quick) if not only or c.name in only]
+
+    results = {}
+    for case in cases:
+        key = f"{case.name}[{case.size}]"
+        res = measure(case, args.repeat)
+        results[key] = res
+        print(
+            f"{key:<40} median {res['median_s']*1e3:9.2f} ms  "
+            f"{res['throughput_per_s']:12,.0f} {case.unit}/s  peak {res['peak_mem_mb']:8.1f} MB"
+        )
+
+    regressions = []
+    if args.compare:
+        if args.baseline.exists():
+            baseline = json.loads(args.baseline.read_text())["results"]
+            regressions = compare(results, baseline, args.threshold)
+        else:
+            print(f"No baseline at {args.baseline}; run with --save-baseline first")
+
+    report = {
+        "meta": {
+            "timestamp": int(time.time()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "quick": args.quick,
+            "repeat": args.repeat,
+        },
+        "results": results,
+        "regressions": regressions,
+    }
+    args.out.write_text(json.dumps(report, indent=2))
+    print(f"Wrote {args.out}")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2))
+        print(f"Saved baseline to {args.baseline}")
+
+    if regressions:
+        print("Regressions:")
+        for line in regressions:
+            print("  " + line)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+# core/backfill.py
+"""
+Historical regime scoring.
+
+Computes the model features once over a long 5m/15m history and scores the
+64-bar window ending at every bar in large batches, instead of one
+live-style build_lstm_input + predict call per bar.
+
+    python -m core.backfill --symbol BTCUSDT --start 2024-01-01 --end 2025-01-01
+    python -m core.backfill --csv-5m btc_5m.csv --csv-15m btc_15m.csv --out btc_regimes.csv
+    python -m core.backfill --symbol BTCUSDT --start 2024-01-01 --from-store
+
+Output is one row per 5m bar: timestamp, regime, confidence and one
+probability column per regime.
+"""
+import argparse
+import importlib.util
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from core.column_store import get_column_store
+from core.compute_features import build_feature_matrix, parse_datetime_series
+from core.data_fetcher import INTERVAL_MS, MAX_KLINE_LIMIT, fetch_raw_klines, klines_to_frame, merge_timeframes
+from core.predictor import SERIES_BATCH_SIZE, RegimePredictor, get_predictor
+
+# extra 5m bars fetched before --start so indicators are warmed up
+# (the live worker scores off the last 300 bars)
+WARMUP_BARS = 300
+
+
+# -------------------------
+# History
+# -------------------------
+def fetch_history(symbol: str, interval: str, start_ms: int, end_ms: Optional[int] = None) -> pd.DataFrame:
+    """Closed klines in [start_ms, end_ms), paged MAX_KLINE_LIMIT at a time."""
+    now_ms = int(time.time() * 1000)
+    end_ms = now_ms if end_ms is None else min(end_ms, now_ms)
+    rows = []
+    cursor = start_ms
+    while cursor < end_ms:
+        page = fetch_raw_klines(symbol, interval, limit=MAX_KLINE_LIMIT, start_time=cursor)
+        if not page:
+            break
+        rows += [r for r in page if r[0] < end_ms and r[6] < now_ms]
+        cursor = page[-1][0] + INTERVAL_MS[interval]
+        if len(page) < MAX_KLINE_LIMIT:
+            break
+    df = klines_to_frame(rows)
+    return df.drop_duplicates("timestamp").reset_index(drop=True)
+
+
+def load_ohlcv_csv(path: str) -> pd.DataFrame:
+    """timestamp/open/high/low/close/volume CSV, as written by klines_to_frame."""
+    df = pd.read_csv(path)
+    df["timestamp"] = parse_datetime_series(df["timestamp"])
+    df = df.dropna(subset=["timestamp"]).sort_values("timestamp")
+    return df[["timestamp", "open", "high", "low", "close", "volume"]].reset_index(drop=True)
+
+
+# -------------------------
+# Scoring
+# -------------------------
+def score_history(
+    merged: pd.DataFrame,
+    predictor: Optional[RegimePredictor] = None,
+    batch_size: int = SERIES_BATCH_SIZE,
+) -> pd.DataFrame:
+    """
+    Per-bar regime table for a merge_timeframes frame. The first
+    time_steps - 1 bars after feature warm-up have no full window and are
+    not in the output.
+    """
+    predictor = predictor or get_predictor()
+
+    # Compute features using SAME logic as training, once for the whole history,
+    # straight into the float32 matrix the windows are cut from
+    features = build_feature_matrix(
+        merged, predictor.features, main_tf="5m", context_tfs=["15m"], dtype=np.float32, dropna=True
+    )
+    probs = predictor.predict_series(features.to_numpy(), batch_size=batch_size)
+
+    names = [predictor.index_to_regime[i] for i in range(probs.shape[1])]
+    best = probs.argmax(axis=1)
+    table = pd.DataFrame({
+        "timestamp": features.index[predictor.time_steps - 1:],
+        "regime": np.asarray(names, dtype=object)[best],
+        "confidence": probs[np.arange(len(probs)), best],
+    })
+    for i, name in enumerate(names):
+        table[name] = probs[:, i]
+    return table
+
+
+def backfill(
+    symbol: str,
+    start: pd.Timestamp,
+    end: Optional[pd.Timestamp] = None,
+    batch_size: int = SERIES_BATCH_SIZE,
+    from_store: bool = False,
+) -> pd.DataFrame:
+    """
+    Score [start, end), plus warm-up bars, fetched from Binance or read
+    from the column store.
+    """
+    start_ms = int(start.timestamp() * 1000)
+    end_ms = int(end.timestamp() * 1000) if end is not None else None
+    fetch_from = start_ms - WARMUP_BARS * INTERVAL_MS["5m"]
+
+    if from_store:
+        store = get_column_store()
+        df_5m = store.read_klines(symbol, "5m", fetch_from, end_ms)
+        df_15m = store.read_klines(symbol, "15m", fetch_from, end_ms)
+    else:
+        df_5m = fetch_history(symbol, "5m", fetch_from, end_ms)
+        df_15m = fetch_history(symbol, "15m", fetch_from, end_ms)
+    table = score_history(merge_timeframes(df_5m, df_15m), batch_size=batch_size)
+    return table[table["timestamp"] >= start].reset_index(drop=True)
+
+
+def _utc(value: Optional[str]) -> Optional[pd.Timestamp]:
+    if value is None:
+        return None
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score regime history in batch")
+    parser.add_argument("--symbol", default="BTCUSDT")
+    parser.add_argument("--start", help="UTC date/time, e.g. 2024-01-01 (fetches from Binance)")
+    parser.add_argument("--end", help="UTC date/time, exclusive (default: now)")
+    parser.add_argument("--from-store", action="store_true", help="read klines from the column store instead")
+    parser.add_argument("--csv-5m", help="score a local 5m OHLCV CSV instead of fetching")
+    parser.add_argument("--csv-15m", help="matching 15m OHLCV CSV")
+    parser.add_argument("--batch-size", type=int, default=SERIES_BATCH_SIZE)
+    parser.add_argument("--out", help="output .csv or .parquet, which needs pyarrow (default regimes_<symbol>.csv)")
+    args = parser.parse_args()
+
+    out = args.out or f"regimes_{args.symbol}.csv"
+    # check before scoring, not after
+    if out.endswith(".parquet") and not any(
+        importlib.util.find_spec(engine) for engine in ("pyarrow", "fastparquet")
+    ):
+        parser.error("--out .parquet needs pyarrow or fastparquet installed (pip install pyarrow)")
+
+    started = time.perf_counter()
+    if args.csv_5m:
+        if not args.csv_15m:
+            parser.error("--csv-5m needs --csv-15m")
+        merged = merge_timeframes(load_ohlcv_csv(args.csv_5m), load_ohlcv_csv(args.csv_15m))
+        table = score_history(merged, batch_size=args.batch_size)
+    elif args.start:
+        table = backfill(
+            args.symbol, _utc(args.start), _utc(args.end),
+            batch_size=args.batch_size, from_store=args.from_store,
+        )
+    else:
+        parser.error("pass --start or --csv-5m/--csv-15m")
+
+    if out.endswith(".parquet"):
+        table.to_parquet(out, index=False)
+    else:
+        table.to_csv(out, index=False)
+    print(f"[Backfill] Scored {len(table)} bars in {time.perf_counter() - started:.1f}s -> {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+# core/column_store.py
+"""
+Append-only columnar store for klines and feature columns.
+
+Tables live under <root>/<symbol>/<interval>/<dataset>/ as one raw
+little-endian file per column plus a meta.json holding the schema and the
+committed row count. Rows are sorted by `open_time` (int64 ms), so a time
+range is two searchsorted calls on the memory-mapped time column and every
+other column is read as a zero-copy memmap slice: loading years of bars
+costs the bytes read, not a text parse.
+
+Appends only accept rows newer than the last stored one. Column files are
+written first and meta.json is replaced (and fsynced) last, so a crash
+mid-append leaves bytes past the committed row count that readers ignore
+and the next append truncates. Only meta.json is fsynced; a table opened
+after a power loss keeps just the rows every column file still holds.
+Appends lock the table's .lock file and re-read meta.json first, so the
+CLI can import into a table while the worker is appending to it.
+
+    python -m core.column_store import-csv --symbol BTCUSDT --interval 5m btc_5m.csv
+    python -m core.column_store build-features --symbol BTCUSDT
+    python -m core.column_store info
+"""
+import argparse
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+STORE_DIR = Path(os.getenv("REGIME_STORE_DIR", "cache/store"))
+TIME_COLUMN = "open_time"
+
+# datasets
+KLINES = "klines"
+FEATURES = "features"
+
+KLINE_FIELDS = ["open", "high", "low", "close", "volume"]
+
+
+def _to_ms(value) -> Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("UTC")
+    return int(ts.timestamp() * 1000)
+
+
+def _frame_times(df: pd.DataFrame) -> np.ndarray:
+    return df["timestamp"].dt.as_unit("ms").astype(np.int64).to_numpy()
+
+
+@contextmanager
+def _file_lock(path: Path):
+    """Exclusive lock on `path` across processes (blocks until acquired)."""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+# -------------------------
+# Table
+# -------------------------
+class ColumnTable:
+    """One append-only table: meta.json plus one binary file per column."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.columns: Dict[str, dict] = {}  # name -> {"dtype", "file"}
+        self.rows = 0
+        self._meta_version = None
+        self._load_meta()
+
+    def _load_meta(self, force: bool = False):
+        """(Re)read meta.json if another process replaced it since the last read."""
+        meta = self.path / "meta.json"
+        try:
+            st = meta.stat()
+        except FileNotFoundError:
+            return
+        # every commit replaces the file, so a new inode means new rows
+        version = (st.st_ino, st.st_mtime_ns)
+        if version == self._meta_version and not force:
+            return
+        with meta.open("r") as f:
+            data = json.load(f)
+        self._meta_version = version
+        self.columns = {c["name"]: c for c in data["columns"]}
+        self.rows = int(data["rows"])
+        # column files aren't fsynced, so after a power loss they can be
+        # shorter than the committed count: keep only rows every file has
+        for spec in self.columns.values():
+            file = self.path / spec["file"]
+            size = file.stat().st_size if file.exists() else 0
+            self.rows = min(self.rows, size // np.dtype(spec["dtype"]).itemsize)
+
+    def _write_meta(self):
+        meta = self.path / "meta.json"
+        tmp = meta.with_suffix(".tmp")
+        with tmp.open("w") as f:
+            json.dump({"columns": list(self.columns.values()), "rows": self.rows}, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, meta)
+        st = meta.stat()
+        self._meta_version = (st.st_ino, st.st_mtime_ns)
+
+    def _column(self, name: str, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        stop = self.rows if stop is None else stop
+        spec = self.columns[name]
+        dtype = np.dtype(spec["dtype"])
+        if stop <= start:
+            return np.empty(0, dtype=dtype)
+        # map only the committed rows; anything past them is a torn append
+        mm = np.memmap(self.path / spec["file"], dtype=dtype, mode="r", shape=(self.rows,))
+        return mm[start:stop]
+
+    @property
+    def first_time(self) -> Optional[int]:
+        if self.rows == 0:
+            return None
+        return int(self._column(TIME_COLUMN, 0, 1)[0])
+
+    @property
+    def last_time(self) -> Optional[int]:
+        if self.rows == 0:
+            return None
+        return int(self._column(TIME_COLUMN, self.rows - 1)[0])
+
+    def append(self, arrays: Dict[str, np.ndarray]) -> int:
+        """
+        Append rows given as {column: 1-D array}, sorted by TIME_COLUMN.
+        Rows not newer than the last stored one are skipped; returns the
+        number of rows written. The first append fixes the schema.
+
+        Appends hold an exclusive lock on the table's .lock file and re-read
+        meta.json under it, so the worker and the CLI can append to the same
+        table from different processes.
+        """
+        times = np.asarray(arrays[TIME_COLUMN], dtype=np.int64)
+        if len(times) > 1 and (np.diff(times) <= 0).any():
+            raise ValueError(f"{self.path}: {TIME_COLUMN} must be strictly increasing")
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        with self._lock, _file_lock(self.path / ".lock"):
+            self._load_meta(force=True)
+            if not self.columns:
+                names = [TIME_COLUMN] + [n for n in arrays if n != TIME_COLUMN]
+                for i, name in enumerate(names):
+                    dtype = np.int64 if name == TIME_COLUMN else np.asarray(arrays[name]).dtype
+                    self.columns[name] = {
+                        "name": name,
+                        "dtype": np.dtype(dtype).newbyteorder("<").str,
+                        "file": f"{i:03d}.bin",
+                    }
+            elif set(arrays) != set(self.columns):
+                raise ValueError(
+                    f"{self.path}: columns {sorted(arrays)} don't match the stored schema {sorted(self.columns)}"
+                )
+
+            last = self.last_time
+            start = 0 if last is None else int(np.searchsorted(times, last, side="right"))
+            if start >= len(times):
+                return 0
+
+            # column files aren't fsynced: until meta.json is, the new bytes
+            # sit past the committed row count and a crash just drops them
+            for name, spec in self.columns.items():
+                values = np.ascontiguousarray(arrays[name][start:], dtype=np.dtype(spec["dtype"]))
+                with open(self.path / spec["file"], "ab") as f:
+                    f.truncate(self.rows * values.itemsize)
+                    f.write(values.tobytes())
+            self.rows += len(times) - start
+            self._write_meta()
+            return len(times) - start
+
+    def read(self, start=None, end=None, columns: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+        """
+        Rows with start <= open_time < end (ms ints or anything pd.Timestamp
+        accepts, naive values are UTC), as read-only memmap slices.
+        """
+        with self._lock:
+            self._load_meta()
+        if columns is None:
+            columns = list(self.columns)
+        elif TIME_COLUMN not in columns:
+            columns = [TIME_COLUMN] + list(columns)
+        missing = [c for c in columns if c not in self.columns]
+        if missing:
+            raise KeyError(f"{self.path}: unknown columns {missing}")
+
+        times = self._column(TIME_COLUMN)
+        lo = 0 if start is None else int(np.searchsorted(times, _to_ms(start), side="left"))
+        hi = self.rows if end is None else int(np.searchsorted(times, _to_ms(end), side="left"))
+        return {name: self._column(name, lo, max(lo, hi)) for name in columns}
+
+    def read_frame(self, start=None, end=None, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """read() as a DataFrame with a UTC `timestamp` column in place of open_time."""
+        arrays = self.read(start, end, columns)
+        times = arrays.pop(TIME_COLUMN)
+        df = pd.DataFrame({"timestamp": pd.to_datetime(np.asarray(times), unit="ms", utc=True)})
+        for name, values in arrays.items():
+            df[name] = values
+        return df
+
+
+# -------------------------
+# Store
+# -------------------------
+class ColumnStore:
+    """Tables keyed by (symbol, interval, dataset)."""
+
+    def __init__(self, root: Path = STORE_DIR):
+        self.root = Path(root)
+        self._tables: Dict[tuple, ColumnTable] = {}
+        self._lock = threading.Lock()
+
+    def table(self, symbol: str, interval: str, dataset: str = KLINES) -> ColumnTable:
+        key = (symbol, interval, dataset)
+        with self._lock:
+            table = self._tables.get(key)
+            if table is None:
+                table = ColumnTable(self.root / symbol / interval / dataset)
+                self._tables[key] = table
+        return table
+
+    def tables(self) -> List[tuple]:
+        """(symbol, interval, dataset) of every table on disk."""
+        return sorted(
+            tuple(meta.parent.relative_to(self.root).parts)
+            for meta in self.root.glob("*/*/*/meta.json")
+        )
+
+    def append_frame(self, symbol: str, interval: str, df: pd.DataFrame, dataset: str = KLINES) -> int:
+        """Append a frame with a `timestamp` column; other non-numeric columns are dropped."""
+        arrays = {TIME_COLUMN: _frame_times(df)}
+        for name in df.columns:
+            if name != "timestamp" and pd.api.types.is_numeric_dtype(df[name]):
+                arrays[name] = df[name].to_numpy()
+        return self.table(symbol, interval, dataset).append(arrays)
+
+    def append_klines(self, symbol: str, interval: str, df: pd.DataFrame) -> int:
+        """Append closed bars of a klines_to_frame-style frame."""
+        return self.append_frame(symbol, interval, df[["timestamp"] + KLINE_FIELDS].astype({c: np.float64 for c in KLINE_FIELDS}))
+
+    def read_klines(self, symbol: str, interval: str, start=None, end=None) -> pd.DataFrame:
+        """timestamp/open/high/low/close/volume frame, as fetch_klines returns."""
+        return self.table(symbol, interval, KLINES).read_frame(start, end, KLINE_FIELDS)
+
+    def read_features(self, symbol: str, interval: str, start=None, end=None, columns=None) -> pd.DataFrame:
+        return self.table(symbol, interval, FEATURES).read_frame(start, end, columns)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_column_store() -> ColumnStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ColumnStore()
+    return _store
+
+
+# -------------------------
+# CLI
+# -------------------------
+def import_csv(store: ColumnStore, symbol: str, interval: str, path: str, dataset: str = KLINES,
+               chunksize: int = 500_000) -> int:
+    """Import a timestamped CSV (klines, or a feature/training file) chunk by chunk."""
+    from core.compute_features import parse_datetime_series
+
+    written = 0
+    skipped = set()
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        ts_col = "timestamp" if "timestamp" in chunk.columns else TIME_COLUMN
+        chunk["timestamp"] = parse_datetime_series(chunk.pop(ts_col))
+        chunk = chunk.dropna(subset=["timestamp"]).sort_values("timestamp").drop_duplicates("timestamp")
+        if dataset == KLINES:
+            chunk = chunk[["timestamp"] + KLINE_FIELDS]
+        skipped |= {c for c in chunk.columns if c != "timestamp" and not pd.api.types.is_numeric_dtype(chunk[c])}
+        written += store.append_frame(symbol, interval, chunk, dataset)
+    if skipped:
+        print(f"[ColumnStore] Skipped non-numeric columns: {sorted(skipped)}")
+    return written
+
+
+def build_feature_table(store: ColumnStore, symbol: str, main_tf: str = "5m", context_tfs=("15m",)) -> int:
+    """Compute build_features over the stored klines and append the new rows."""
+    from core.compute_features import build_features
+    from core.data_fetcher import merge_timeframes
+
+    merged = merge_timeframes(
+        store.read_klines(symbol, main_tf),
+        *[store.read_klines(symbol, tf) for tf in context_tfs],
+        main_tf=main_tf,
+        context_tfs=context_tfs,
+    )
+    features_df = build_features(merged, main_tf=main_tf, context_tfs=list(context_tfs), dropna=True)
+    return store.append_frame(symbol, main_tf, features_df, FEATURES)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar kline/feature store")
+    parser.add_argument("--root", default=str(STORE_DIR))
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    imp = sub.add_parser("import-csv", help="append a CSV to a table")
+    imp.add_argument("path")
+    imp.add_argument("--symbol", required=True)
+    imp.add_argument("--interval", default="5m")
+    imp.add_argument("--dataset", default=KLINES, choices=[KLINES, FEATURES])
+
+    feats = sub.add_parser("build-features", help="compute features from the stored 5m/15m klines")
+    feats.add_argument("--symbol", required=True)
+
+    sub.add_parser("info", help="list tables")
+    args = parser.parse_args()
+
+    store = ColumnStore(Path(args.root))
+    if args.command == "import-csv":
+        n = import_csv(store, args.symbol, args.interval, args.path, args.dataset)
+        print(f"[ColumnStore] Appended {n} rows to {args.symbol}/{args.interval}/{args.dataset}")
+    elif args.command == "build-features":
+        n = build_feature_table(store, args.symbol)
+        print(f"[ColumnStore] Appended {n} feature rows for {args.symbol}")
+    elif args.command == "info":
+        for symbol, interval, dataset in store.tables():
+            table = store.table(symbol, interval, dataset)
+            span = ""
+            if table.rows:
+                span = (
+                    f" {pd.Timestamp(table.first_time, unit='ms', tz='UTC')}"
+                    f" .. {pd.Timestamp(table.last_time, unit='ms', tz='UTC')}"
+                )
+            print(f"{symbol}/{interval}/{dataset}: {table.rows} rows, {len(table.columns)} columns{span}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,141 @@
 # src/compute_features.py
+import itertools
 import numpy as np
 import pandas as pd
 import talib
 from typing import Optional
+from pandas.tseries.api import guess_datetime_format
 
 EPS = 1e-12
 import json
 
-def parse_datetime_series(s: pd.Series) -> pd.Series:
-    """Robustly parse mixed datetime formats and epoch numbers to tz-aware UTC datetimes."""
-    # Try straightforward parse first (no infer_datetime_format arg)
-    out = pd.to_datetime(s, utc=True, errors='coerce')
+# (upper bound on |value|, ns per unit): seconds until ~5138, then ms, us, ns
+_EPOCH_UNITS = ((1e11, 10**9), (1e14, 10**6), (1e17, 10**3))
+_NUMERIC_RE = r'^\s*"?-?\d+(\.\d+)?"?\s*$'
 
-    # If everything parsed, return
-    if out.notna().all():
-        return out
 
-    # Fallback: attempt cleaning (strip quotes) and numeric epoch detection
-    raw = s.astype(str).str.strip().str.replace('"', '')
-    is_digits = raw.str.match(r'^\d{10,16}$')  # seconds or ms-ish
-    if is_digits.any():
-        sample = raw[is_digits].iloc[0]
+def _epoch_to_utc(values: np.ndarray) -> pd.DatetimeIndex:
+    """Epoch numbers -> UTC datetimes; the unit (s/ms/us/ns) is picked per value from its magnitude."""
+    values = np.asarray(values)
+    if values.dtype.kind == 'f':
+        valid = np.isfinite(values)
+        filled = np.where(valid, values, 0.0)
+        if np.array_equal(filled, np.trunc(filled)):
+            values = filled.astype(np.int64)
+        else:
+            values = filled
+    else:
+        valid = np.ones(len(values), dtype=bool)
+        values = values.astype(np.int64, copy=False)
+
+    mag = np.abs(values)
+    factor = np.select([mag < bound for bound, _ in _EPOCH_UNITS], [f for _, f in _EPOCH_UNITS], default=1)
+    valid &= mag <= np.iinfo(np.int64).max // factor
+    if values.dtype.kind == 'f':
+        ns = np.round(values * factor)
+        ns = np.where(valid, ns, 0).astype(np.int64)
+    else:
+        ns = np.where(valid, values, 0) * factor
+    ns[~valid] = np.iinfo(np.int64).min  # NaT
+    return pd.DatetimeIndex(ns.view('datetime64[ns]')).tz_localize('UTC')
+
+
+def parse_datetime_series(s: pd.Series) -> pd.Series:
+    """
+    Robustly parse mixed datetime formats and epoch numbers to tz-aware UTC datetimes.
+
+    Already-parsed columns are returned as is (converted to UTC if needed).
+    Numeric columns are epoch s/ms/us/ns, told apart by magnitude. String
+    columns are parsed with one format guessed from the first value; only
+    rows that don't fit it are parsed one by one, and their count is left
+    in `out.attrs['slow_path_rows']`.
+    """
+    dtype = s.dtype
+    if isinstance(dtype, pd.DatetimeTZDtype):
+        return s if str(dtype.tz) == 'UTC' else s.dt.tz_convert('UTC')
+    if dtype.kind == 'M':
+        return s.dt.tz_localize('UTC')
+    if dtype.kind in 'iuf':
+        return pd.Series(_epoch_to_utc(s.to_numpy()), index=s.index, name=s.name)
+
+    nonnull = s.dropna()
+    if nonnull.empty:
+        return pd.to_datetime(s, utc=True, errors='coerce')
+
+    sample = nonnull.iloc[0]
+    fmt = None
+    if isinstance(sample, str):
+        if pd.Series([sample]).str.match(_NUMERIC_RE).iloc[0]:
+            numeric = pd.to_numeric(s.astype(str).str.strip().str.replace('"', ''), errors='coerce')
+            if numeric.notna().sum() == len(nonnull):
+                return pd.Series(_epoch_to_utc(numeric.to_numpy(dtype=np.float64)), index=s.index, name=s.name)
+        fmt = guess_datetime_format(sample.strip().strip('"'))
+
+    # one explicit format (or datetime objects) parses in a single vectorized pass
+    if fmt is not None:
+        out = pd.to_datetime(s, format=fmt, utc=True, errors='coerce')
+    else:
         try:
-            if len(sample) >= 13:
-                # epoch ms
-                out.loc[is_digits] = pd.to_datetime(raw[is_digits].astype(np.int64), unit='ms', utc=True, errors='coerce')
-            else:
-                # epoch seconds
-                out.loc[is_digits] = pd.to_datetime(raw[is_digits].astype(np.int64), unit='s', utc=True, errors='coerce')
-        except Exception:
-            pass
+            out = pd.to_datetime(s, utc=True, errors='coerce')
+        except (ValueError, TypeError):
+            out = pd.Series(pd.NaT, index=s.index, dtype='datetime64[ns, UTC]')
 
-    # Final attempt: per-item parse (slower but robust)
-    mask = out.isna()
+    # rows that didn't fit: strip quotes, try epoch numbers, then per-item parse
+    mask = out.isna() & s.notna()
+    slow_rows = 0
     if mask.any():
-        out.loc[mask] = raw[mask].apply(lambda x: pd.to_datetime(x, utc=True, errors='coerce'))
-
+        raw = s[mask].astype(str).str.strip().str.replace('"', '')
+        is_digits = raw.str.match(r'^-?\d+(\.\d+)?$')
+        if is_digits.any():
+            out.loc[raw.index[is_digits.to_numpy()]] = _epoch_to_utc(raw[is_digits].astype(np.float64).to_numpy())
+        rest = raw[~is_digits.to_numpy()]
+        if len(rest):
+            slow_rows = len(rest)
+            out.loc[rest.index] = pd.to_datetime(rest, format='mixed', utc=True, errors='coerce')
+
+    out.attrs['slow_path_rows'] = slow_rows
     return out
 
 
-
 # -------------------------
 # Utilities
 # -------------------------
+DEFAULT_CHUNK_ROWS = 100_000
+
+
+def iter_record_chunks(path: str, chunksize: int = DEFAULT_CHUNK_ROWS):
+    """
+    Yield DataFrames of at most `chunksize` records from a JSON-lines or CSV
+    file without loading the whole file. A file holding one JSON document
+    (an array or a pretty-printed object) can't be split by line, so it is
+    loaded whole and then sliced.
+    """
+    if path.endswith('.json') or path.endswith('.jsonl') or path.endswith('.ndjson'):
+        with open(path, 'r') as f:
+            head = f.read(1024).lstrip()
+        if not head.startswith('['):
+            first = True
+            try:
+                with pd.read_json(path, lines=True, chunksize=chunksize) as reader:
+                    for chunk in reader:
+                        first = False
+                        yield chunk
+                return
+            except ValueError:
+                if not first:
+                    raise
+        with open(path, 'r') as f:
+            payload = json.load(f)
+        if isinstance(payload, dict):
+            payload = [payload]
+        for lo in range(0, len(payload), chunksize):
+            yield pd.DataFrame(payload[lo:lo + chunksize])
+        return
+
+    with pd.read_csv(path, chunksize=chunksize) as reader:
+        yield from reader
+
+
 def parse_depth_snapshot_json(path: str, ts_field_candidates=('fetched_at','fetchedAt','timestamp','time')):
     """
     Load depth snapshot JSON/JSONL, rename parsed timestamp column to 'timestamp' (UTC),
@@ -58,6 +151,22 @@ def parse_depth_snapshot_json(path: str, ts_field_candidates=('fetched_at','fetc
             payload = [payload]
         df = pd.DataFrame(payload)
 
+    return _normalize_depth_frame(df, ts_field_candidates)
+
+
+def iter_depth_snapshot_chunks(
+    path: str,
+    chunksize: int = DEFAULT_CHUNK_ROWS,
+    ts_field_candidates=('fetched_at','fetchedAt','timestamp','time')
+):
+    """Like parse_depth_snapshot_json, but yields normalized frames of at most `chunksize` snapshots."""
+    for chunk in iter_record_chunks(path, chunksize):
+        chunk = _normalize_depth_frame(chunk, ts_field_candidates)
+        if not chunk.empty:
+            yield chunk
+
+
+def _normalize_depth_frame(df: pd.DataFrame, ts_field_candidates) -> pd.DataFrame:
     if df.empty:
         return df
 
@@ -153,18 +262,55 @@ def safe_talib(func, *args, **kwargs):
         nan_arr = np.full(n, np.nan)
         return (nan_arr, nan_arr,nan_arr)
 
+def rolling_median_mad(values, window: int = 50, chunk_rows: int = 65536):
+    """
+    Rolling median and median absolute deviation with min_periods=1.
+
+    Full windows are evaluated in blocks of `chunk_rows` with np.median over
+    a strided view rather than a Python callback per row. A window holding a
+    NaN yields NaN for both. The live worker uses RollingRobustZScore in
+    core.incremental_features instead.
+    """
+    x = np.asarray(values, dtype=np.float64)
+    n = len(x)
+    med = np.empty(n)
+    mad = np.empty(n)
+
+    # leading partial windows (min_periods=1)
+    for i in range(min(window - 1, n)):
+        w = x[:i + 1]
+        m = np.median(w)
+        med[i] = m
+        mad[i] = np.median(np.abs(w - m))
+
+    if n >= window:
+        windows = np.lib.stride_tricks.sliding_window_view(x, window)
+        for start in range(0, len(windows), chunk_rows):
+            block = windows[start:start + chunk_rows]
+            m = np.median(block, axis=1)
+            out = slice(window - 1 + start, window - 1 + start + len(block))
+            med[out] = m
+            mad[out] = np.median(np.abs(block - m[:, None]), axis=1)
+
+    return med, mad
+
 def robust_zscore(s: pd.Series, window: int = 50) -> pd.Series:
-    med = s.rolling(window=window, min_periods=1).median()
-    mad = s.rolling(window=window, min_periods=1).apply(
-        lambda x: np.median(np.abs(x - np.median(x))) if len(x) > 0 else np.nan, raw=True
-    )
-    mad_adj = mad * 1.4826 + EPS
+    med, mad = rolling_median_mad(s.to_numpy(dtype=np.float64), window)
+    med = pd.Series(med, index=s.index)
+    mad_adj = pd.Series(mad, index=s.index) * 1.4826 + EPS
     return (s - med) / mad_adj
 
 # -------------------------
 # Aggregation helpers
 # -------------------------
-def load_and_normalize_funding(path: str):
+def load_and_normalize_funding(path: str, chunksize: Optional[int] = None):
+    if chunksize:
+        parts = [_normalize_funding_frame(c) for c in iter_record_chunks(path, chunksize)]
+        parts = [p for p in parts if p is not None]
+        if not parts:
+            return None
+        return pd.concat(parts, ignore_index=True).sort_values('timestamp').reset_index(drop=True)
+
     try:
         if path.endswith('.json') or path.endswith('.jsonl'):
             df = pd.read_json(path, lines=True)
@@ -180,6 +326,10 @@ def load_and_normalize_funding(path: str):
         except Exception:
             return None
 
+    return _normalize_funding_frame(df)
+
+
+def _normalize_funding_frame(df: pd.DataFrame):
     if df is None or df.empty:
         return None
 
@@ -219,14 +369,22 @@ def load_and_normalize_funding(path: str):
 
     return df[['timestamp','fundingRate']].sort_values('timestamp').reset_index(drop=True)
 
-def load_and_normalize_oi(path: str):
+def load_and_normalize_oi(path: str, chunksize: Optional[int] = None):
     """
     Robust loader for open interest files.
     Handles:
       - JSON lines or single JSON objects with fields like {"time": 1758482274421, "openInterest": "88794.463"}
       - CSV with time/open_interest columns
     Returns DataFrame with ['timestamp' (datetime64[ns, UTC]), 'openInterest' (float)] or None.
+    With `chunksize`, the file is read and normalized in chunks of that many records.
     """
+    if chunksize:
+        parts = [_normalize_oi_frame(c) for c in iter_record_chunks(path, chunksize)]
+        parts = [p for p in parts if p is not None]
+        if not parts:
+            return None
+        return pd.concat(parts, ignore_index=True).sort_values('timestamp').reset_index(drop=True)
+
     try:
         if path.endswith('.json') or path.endswith('.jsonl') or path.endswith('.ndjson'):
             df = pd.read_json(path, lines=True)
@@ -243,6 +401,10 @@ def load_and_normalize_oi(path: str):
         except Exception:
             return None
 
+    return _normalize_oi_frame(df)
+
+
+def _normalize_oi_frame(df: pd.DataFrame):
     if df is None or df.empty:
         return None
 
@@ -281,6 +443,93 @@ def load_and_normalize_oi(path: str):
     out = out.sort_values('timestamp').reset_index(drop=True)
     return out
 
+def _bucket_sums(columns: list, starts: np.ndarray, counts: np.ndarray) -> list:
+    """
+    NaN-skipping per-bucket sums (0.0 for empty buckets) of several columns.
+    Each bucket is a contiguous slice summed with numpy's pairwise sum, which
+    is what Series.sum does, so results are bit-identical to a per-group sum
+    (np.add.reduceat sums sequentially and is not).
+    """
+    stacked = np.stack([np.where(np.isnan(c), 0.0, c) for c in columns])
+    out = np.zeros((len(columns), len(starts)))
+    for i in np.flatnonzero(counts):
+        s = starts[i]
+        out[:, i] = stacked[:, s:s + counts[i]].sum(axis=1)
+    return list(out)
+
+
+def _aggregate_trade_buckets(
+    df: pd.DataFrame,
+    price_col: str,
+    qty_col: str,
+    taker_col: Optional[str],
+    resample_rule: str
+) -> pd.DataFrame:
+    """
+    Per-bucket trade stats for a time-indexed, sorted frame. Buckets come
+    from resample() so labels and empty buckets match a resample().apply;
+    every statistic is a segmented reduction over the contiguous rows of a
+    bucket instead of building a Series per bucket.
+    """
+    df = df[df.index.notna()]
+    counts_s = df[qty_col].resample(resample_rule).size()
+    counts = counts_s.to_numpy(dtype=np.int64)
+    starts = np.cumsum(counts) - counts
+    codes = np.repeat(np.arange(len(counts)), counts)
+
+    price = df[price_col].to_numpy(dtype=np.float64)
+    qty = df[qty_col].to_numpy(dtype=np.float64)
+
+    taker = df[taker_col].to_numpy(dtype=np.float64) if taker_col is not None else None
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if taker is not None:
+            total_vol, pq_sum, tb, pt_sum = _bucket_sums([qty, price * qty, taker, price * taker], starts, counts)
+        else:
+            total_vol, pq_sum = _bucket_sums([qty, price * qty], starts, counts)
+        has_vol = total_vol > 0
+        vwap_all = np.where(has_vol, pq_sum / (total_vol + EPS), np.nan)
+
+        out = {
+            'trade_count_5m': counts.astype(np.float64),
+            'volume_5m_from_agg': total_vol,
+            'vwap_all_5m': vwap_all,
+        }
+
+        if taker is not None:
+            has_tb = tb > 0
+            vwap_taker = np.where(has_tb, pt_sum / (tb + EPS), np.nan)
+            out['taker_buy_vol_5m'] = tb
+            out['taker_buy_ratio_5m'] = np.where(has_vol, tb / (total_vol + EPS), np.nan)
+            out['trade_imbalance_5m'] = np.where(has_vol, (2.0*tb - total_vol) / (total_vol + EPS), np.nan)
+            out['vwap_taker_5m'] = vwap_taker
+            out['vwap_skew_5m'] = np.where(has_tb, vwap_taker - vwap_all, 0.0)
+        else:
+            out['taker_buy_vol_5m'] = np.full(len(counts), np.nan)
+            out['taker_buy_ratio_5m'] = np.full(len(counts), np.nan)
+            out['trade_imbalance_5m'] = np.full(len(counts), np.nan)
+            out['vwap_skew_5m'] = np.full(len(counts), np.nan)
+
+        # max |log return| between consecutive priced ticks of the same bucket
+        max_tick = np.zeros(len(counts))
+        priced = ~np.isnan(price)
+        p = price[priced]
+        c = codes[priced]
+        if len(p) > 1:
+            same = c[1:] == c[:-1]
+            lr = np.abs(np.log(p[1:][same] / p[:-1][same] + EPS))
+            np.fmax.at(max_tick, c[1:][same], lr)
+        out['max_tick_ret_5m'] = max_tick
+
+    return pd.DataFrame(out, index=counts_s.index)
+
+
+def _trade_ts_column(df: pd.DataFrame, ts_col: str) -> Optional[str]:
+    if ts_col in df.columns:
+        return ts_col
+    return next((alt for alt in ('T','time','timestamp_ms','ts') if alt in df.columns), None)
+
+
 def aggregate_aggtrades_to_5m(
     agg_df: pd.DataFrame,
     ts_col: str = 'timestamp',
@@ -295,15 +544,10 @@ def aggregate_aggtrades_to_5m(
 
     df = agg_df.copy()
 
-    # normalize timestamp if present
-    if ts_col in df.columns:
-        df[ts_col] = parse_datetime_series(df[ts_col])
-    else:
-        # try common alternates
-        for alt in ('T','time','timestamp_ms','ts'):
-            if alt in df.columns:
-                df[ts_col] = parse_datetime_series(df[alt])
-                break
+    # normalize timestamp if present (else try common alternates)
+    ts_src = _trade_ts_column(df, ts_col)
+    if ts_src is not None:
+        df[ts_col] = parse_datetime_series(df[ts_src])
 
     # detect whether file is per-trade (price+qty) or pre-aggregated OHLCV
     price_col = next((c for c in price_candidates if c in df.columns), None)
@@ -341,43 +585,8 @@ def aggregate_aggtrades_to_5m(
         raise KeyError("aggregate_aggtrades_to_5m: no timestamp column found after attempts.")
     df = df.set_index(ts_col).sort_index()
 
-    def agg_func(g: pd.DataFrame):
-        out = {}
-        total_vol = float(g[qty_col].sum()) if qty_col in g.columns else 0.0
-        out['trade_count_5m'] = int(g.shape[0])
-        out['volume_5m_from_agg'] = total_vol
-        out['vwap_all_5m'] = float((g[price_col] * g[qty_col]).sum() / (total_vol + EPS)) if total_vol > 0 else np.nan
-
-        if taker_buy_vol_col in g.columns:
-            tb = float(g[taker_buy_vol_col].sum())
-            out['taker_buy_vol_5m'] = tb
-            out['taker_buy_ratio_5m'] = tb / (total_vol + EPS) if total_vol > 0 else np.nan
-            out['trade_imbalance_5m'] = (2.0*tb - total_vol) / (total_vol + EPS) if total_vol > 0 else np.nan
-            if tb > 0:
-                out['vwap_taker_5m'] = float((g[price_col] * g[taker_buy_vol_col]).sum() / (tb + EPS))
-                out['vwap_skew_5m'] = out['vwap_taker_5m'] - out['vwap_all_5m']
-            else:
-                out['vwap_taker_5m'] = np.nan
-                out['vwap_skew_5m'] = 0.0
-        else:
-            out['taker_buy_vol_5m'] = np.nan
-            out['taker_buy_ratio_5m'] = np.nan
-            out['trade_imbalance_5m'] = np.nan
-            out['vwap_skew_5m'] = np.nan
-
-        # max tick return inside bucket (use per-row price sequence)
-        if len(g) > 1:
-            prices = g[price_col].dropna()
-            if len(prices) > 1:
-                lr = np.log(prices / prices.shift(1) + EPS).dropna()
-                out['max_tick_ret_5m'] = float(lr.abs().max()) if not lr.empty else 0.0
-            else:
-                out['max_tick_ret_5m'] = 0.0
-        else:
-            out['max_tick_ret_5m'] = 0.0
-        return pd.Series(out)
-
-    agg5 = df.resample(resample_rule).apply(lambda g: agg_func(g))
+    taker_col = taker_buy_vol_col if taker_buy_vol_col in df.columns else None
+    agg5 = _aggregate_trade_buckets(df, price_col, qty_col, taker_col, resample_rule)
     agg5 = agg5.reset_index()
     # normalize timestamp tz
     agg5[ts_col] = parse_datetime_series(agg5[ts_col])
@@ -385,13 +594,84 @@ def aggregate_aggtrades_to_5m(
 
 
 
+def _pack_book_side(cells) -> tuple:
+    """
+    Pack a column of [[price, qty], ...] lists into NaN-padded (n, max_levels)
+    float arrays. Returns (prices, qtys, n_levels); rows that are missing or
+    malformed get n_levels = -1.
+    """
+    n = len(cells)
+    lengths = np.full(n, -1, dtype=np.int64)
+    for i, cell in enumerate(cells):
+        if isinstance(cell, (list, tuple, np.ndarray)):
+            lengths[i] = len(cell)
+
+    width = max(int(lengths.max()) if n else 0, 1)
+    prices = np.full((n, width), np.nan)
+    qtys = np.full((n, width), np.nan)
+
+    rows = np.flatnonzero(lengths > 0)
+    counts = lengths[rows]
+    try:
+        # one pass over every level of every book in the chunk
+        flat = np.fromiter(
+            itertools.chain.from_iterable(itertools.chain.from_iterable(cells[i] for i in rows)),
+            dtype=np.float64
+        )
+        if flat.size != 2 * counts.sum():
+            raise ValueError("levels are not [price, qty] pairs")
+        row_idx = np.repeat(rows, counts)
+        col_idx = np.arange(len(row_idx)) - np.repeat(np.cumsum(counts) - counts, counts)
+        prices[row_idx, col_idx] = flat[0::2]
+        qtys[row_idx, col_idx] = flat[1::2]
+    except (ValueError, TypeError, IndexError):
+        # some book is malformed: pack row by row and drop only the bad ones
+        for i in rows:
+            k = lengths[i]
+            try:
+                side = np.asarray([lvl[:2] for lvl in cells[i]], dtype=np.float64)
+                prices[i, :k] = side[:, 0]
+                qtys[i, :k] = side[:, 1]
+            except (ValueError, TypeError, IndexError):
+                lengths[i] = -1
+    return prices, qtys, lengths
+
+
+def _band_depths(prices: np.ndarray, qtys: np.ndarray, bounds: dict, descending: bool) -> dict:
+    """
+    Quantity resting inside each price bound, per row. Binance sends levels
+    best-first, so the levels inside a band are a prefix and each band is a
+    single lookup into one cumulative sum. Unsorted books fall back to a
+    masked cumulative sum per band (same summation order as the levels).
+    """
+    with np.errstate(invalid='ignore'):
+        steps = np.diff(prices, axis=1)
+        steps = -steps if descending else steps
+    is_sorted = bool(np.all((steps >= 0) | np.isnan(steps)))
+
+    q = np.nan_to_num(qtys, nan=0.0)
+    cum = np.cumsum(q, axis=1) if is_sorted else None
+    rows = np.arange(len(prices))
+    out = {}
+    for name, bound in bounds.items():
+        with np.errstate(invalid='ignore'):
+            inside = prices >= bound[:, None] if descending else prices <= bound[:, None]
+        if is_sorted:
+            n_inside = inside.sum(axis=1)
+            out[name] = np.where(n_inside > 0, cum[rows, np.maximum(n_inside - 1, 0)], 0.0)
+        else:
+            out[name] = np.cumsum(np.where(inside, q, 0.0), axis=1)[:, -1]
+    return out
+
+
 def aggregate_depth_snapshot_to_5m(
     depth_snap_df: pd.DataFrame,
     ts_col: str = 'timestamp',
     bids_col: str = 'bids',
     asks_col: str = 'asks',
     resample_rule: str = '5min',
-    band_pcts = (0.001, 0.005)
+    band_pcts = (0.001, 0.005),
+    chunk_rows: int = 2048
 ) -> pd.DataFrame:
     if depth_snap_df is None or depth_snap_df.empty:
         return pd.DataFrame(columns=['timestamp'])
@@ -400,57 +680,139 @@ def aggregate_depth_snapshot_to_5m(
     df = _ensure_dt(df, ts_col)
     df = df.sort_values(ts_col)
 
-    def compute_row_features(row):
-        out = {}
-        bids = row.get(bids_col, None)
-        asks = row.get(asks_col, None)
-        if (not bids) or (not asks):
-            # missing data
-            for pct in band_pcts:
-                out[f'bid_depth_{int(pct*10000)}bps'] = np.nan
-                out[f'ask_depth_{int(pct*10000)}bps'] = np.nan
-                out[f'pressure_index_{int(pct*10000)}bps'] = np.nan
-            out['spread_pct'] = np.nan
-            return pd.Series(out)
-
-        try:
-            best_bid = float(bids[0][0])
-            best_ask = float(asks[0][0])
-        except Exception:
-            # unexpected format
-            for pct in band_pcts:
-                out[f'bid_depth_{int(pct*10000)}bps'] = np.nan
-                out[f'ask_depth_{int(pct*10000)}bps'] = np.nan
-                out[f'pressure_index_{int(pct*10000)}bps'] = np.nan
-            out['spread_pct'] = np.nan
-            return pd.Series(out)
+    n = len(df)
+    bids_all = df[bids_col].to_numpy(dtype=object) if bids_col in df.columns else np.full(n, None, dtype=object)
+    asks_all = df[asks_col].to_numpy(dtype=object) if asks_col in df.columns else np.full(n, None, dtype=object)
+
+    names = ['spread_pct']
+    for pct in band_pcts:
+        names += [f'bid_depth_{int(pct*10000)}bps', f'ask_depth_{int(pct*10000)}bps', f'pressure_index_{int(pct*10000)}bps']
+    feats = {name: np.full(n, np.nan) for name in names}
+
+    # pack in bounded chunks so 1000-level books don't blow up memory
+    for lo in range(0, n, chunk_rows):
+        hi = min(lo + chunk_rows, n)
+        bid_p, bid_q, bid_n = _pack_book_side(bids_all[lo:hi])
+        ask_p, ask_q, ask_n = _pack_book_side(asks_all[lo:hi])
+
+        # best levels are the first ones listed, as before
+        best_bid = bid_p[:, 0]
+        best_ask = ask_p[:, 0]
+        ok = (bid_n > 0) & (ask_n > 0)
+        if not ok.any():
+            continue
+        idx = np.flatnonzero(ok)
+        bid_p, bid_q, ask_p, ask_q = bid_p[idx], bid_q[idx], ask_p[idx], ask_q[idx]
+        best_bid, best_ask = best_bid[idx], best_ask[idx]
 
         mid = (best_bid + best_ask) / 2.0
-        out['spread_pct'] = (best_ask - best_bid) / (mid + EPS)
+        feats['spread_pct'][lo + idx] = (best_ask - best_bid) / (mid + EPS)
+
+        bid_bounds = {pct: mid * (1.0 - pct) for pct in band_pcts}
+        ask_bounds = {pct: mid * (1.0 + pct) for pct in band_pcts}
+        bid_depth = _band_depths(bid_p, bid_q, bid_bounds, descending=True)
+        ask_depth = _band_depths(ask_p, ask_q, ask_bounds, descending=False)
 
         for pct in band_pcts:
-            low_bound = mid * (1.0 - pct)
-            high_bound = mid * (1.0 + pct)
-            bid_qty = 0.0
-            for p, q in bids:
-                p = float(p); q = float(q)
-                if p >= low_bound:
-                    bid_qty += q
-            ask_qty = 0.0
-            for p, q in asks:
-                p = float(p); q = float(q)
-                if p <= high_bound:
-                    ask_qty += q
-            out[f'bid_depth_{int(pct*10000)}bps'] = bid_qty
-            out[f'ask_depth_{int(pct*10000)}bps'] = ask_qty
-            out[f'pressure_index_{int(pct*10000)}bps'] = bid_qty / (ask_qty + EPS)
-        return pd.Series(out)
-
-    snap_feats = df.apply(compute_row_features, axis=1)
+            bps = int(pct*10000)
+            feats[f'bid_depth_{bps}bps'][lo + idx] = bid_depth[pct]
+            feats[f'ask_depth_{bps}bps'][lo + idx] = ask_depth[pct]
+            feats[f'pressure_index_{bps}bps'][lo + idx] = bid_depth[pct] / (ask_depth[pct] + EPS)
+
+    snap_feats = pd.DataFrame(feats, index=df.index)
     snap_feats[ts_col] = df[ts_col].values
     snap_feats = snap_feats.set_index(ts_col).resample(resample_rule).last().reset_index()
     return snap_feats
 
+# -------------------------
+# Streaming (chunked) aggregation
+# -------------------------
+def _stream_buckets(chunks, ts_source, resample_rule: str, aggregate) -> pd.DataFrame:
+    """
+    Feed time-ordered raw chunks through a per-bucket `aggregate(df)` while
+    holding at most one chunk plus one open bucket in memory.
+
+    Rows of the last bucket seen in a chunk are carried into the next chunk
+    so no bucket is split across calls; each call's output is cut just
+    before that bucket (which keeps any empty buckets ahead of it). Buckets
+    are epoch-aligned floors of `resample_rule`, which matches resample()
+    for rules that divide a day, like the default 5min.
+    """
+    parts = []
+    carry = None
+    emitted_until = None
+    for chunk in chunks:
+        if chunk is None or chunk.empty:
+            continue
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+
+        src = ts_source(chunk)
+        if src is None:
+            raise KeyError("streaming aggregation: no timestamp column found in chunk.")
+        buckets = parse_datetime_series(chunk[src]).dt.floor(resample_rule)
+        if emitted_until is not None and (buckets < emitted_until).any():
+            raise ValueError("streaming aggregation needs time-ordered input; got rows for an already emitted bucket")
+
+        last_bucket = buckets.max()
+        if pd.isna(last_bucket):
+            continue
+        in_last = (buckets == last_bucket).to_numpy()
+        carry = chunk[in_last]
+        if in_last.all():
+            continue
+
+        agg = aggregate(chunk)
+        agg = agg[pd.to_datetime(agg.iloc[:, 0], utc=True) < last_bucket]
+        parts.append(agg)
+        emitted_until = last_bucket
+
+    if carry is not None and not carry.empty:
+        parts.append(aggregate(carry))
+    if not parts:
+        return aggregate(pd.DataFrame())
+    return pd.concat(parts, ignore_index=True)
+
+
+def stream_aggregate_aggtrades_to_5m(
+    path: str,
+    chunksize: int = DEFAULT_CHUNK_ROWS,
+    ts_col: str = 'timestamp',
+    resample_rule: str = '5min',
+    **kwargs
+) -> pd.DataFrame:
+    """
+    aggregate_aggtrades_to_5m over a time-ordered JSONL/CSV aggTrades file,
+    read `chunksize` rows at a time. Output matches loading the whole file.
+    """
+    return _stream_buckets(
+        iter_record_chunks(path, chunksize),
+        lambda df: _trade_ts_column(df, ts_col),
+        resample_rule,
+        lambda df: aggregate_aggtrades_to_5m(df, ts_col=ts_col, resample_rule=resample_rule, **kwargs),
+    )
+
+
+def stream_aggregate_depth_to_5m(
+    path: str,
+    chunksize: int = 2_000,
+    resample_rule: str = '5min',
+    band_pcts = (0.001, 0.005),
+    ts_field_candidates=('fetched_at','fetchedAt','timestamp','time')
+) -> pd.DataFrame:
+    """
+    aggregate_depth_snapshot_to_5m over a time-ordered depth snapshot JSONL
+    file, read `chunksize` snapshots at a time (books can be 1000 levels
+    deep, hence the smaller default).
+    """
+    return _stream_buckets(
+        iter_depth_snapshot_chunks(path, chunksize, ts_field_candidates),
+        lambda df: 'timestamp' if 'timestamp' in df.columns else None,
+        resample_rule,
+        lambda df: aggregate_depth_snapshot_to_5m(df, resample_rule=resample_rule, band_pcts=band_pcts),
+    )
+
+
 def merge_funding_and_oi_to_5m(
     kline_df: pd.DataFrame,
     funding_df: Optional[pd.DataFrame] = None,
@@ -570,6 +932,95 @@ def merge_all_sources_to_5m(
 # -------------------------
 # Feature computation (OHLCV indicators)
 # -------------------------
+# per-timeframe indicators, in output column order (<name>_<tf>)
+BASE_FEATURES = (
+    "log_ret_1",
+    "ema_ratio_9_21",
+    "macd_hist",
+    "adx",
+    "atr_norm",
+    "bb_width",
+    "rsi_14",
+    "volume_zscore_50",
+)
+
+OHLCV_PREFIXES = ('open_', 'high_', 'low_', 'close_', 'volume_')
+
+
+def _float_column(df: pd.DataFrame, col: str) -> np.ndarray:
+    # klines are float64 already (TA-Lib needs float64); only cast other dtypes
+    return df[col].to_numpy(dtype=np.float64)
+
+
+def _first_output(out) -> np.ndarray:
+    # safe_talib's fallback is a tuple even for single-output functions
+    return out[0] if isinstance(out, tuple) else out
+
+
+def indicator_columns(
+    open_: np.ndarray,
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    volume: np.ndarray,
+    use_robust_volume_z: bool = False,
+    only=None,
+) -> dict:
+    """
+    BASE_FEATURES for one timeframe as float64 arrays keyed by base name,
+    straight from TA-Lib without Series wrappers. `only` limits the
+    indicators computed to a subset of names.
+    """
+    wanted = set(BASE_FEATURES if only is None else only)
+    out = {}
+
+    # Returns
+    if "log_ret_1" in wanted:
+        prev = np.empty_like(close)
+        prev[0] = np.nan
+        prev[1:] = close[:-1]
+        out["log_ret_1"] = np.log(close / prev + EPS)
+
+    # Trend: EMA ratio 9/21
+    if "ema_ratio_9_21" in wanted:
+        ema9 = _first_output(safe_talib(talib.EMA, close, timeperiod=9))
+        ema21 = _first_output(safe_talib(talib.EMA, close, timeperiod=21))
+        out["ema_ratio_9_21"] = ema9 / (ema21 + EPS)
+
+    # MACD hist
+    if "macd_hist" in wanted:
+        macd, macd_signal, macd_hist = safe_talib(talib.MACD, close, 12, 26, 9)
+        out["macd_hist"] = macd_hist
+
+    # ADX
+    if "adx" in wanted:
+        out["adx"] = _first_output(safe_talib(talib.ADX, high, low, close, timeperiod=14))
+
+    # Volatility: ATR normalized and BB width
+    if "atr_norm" in wanted:
+        atr14 = _first_output(safe_talib(talib.ATR, high, low, close, timeperiod=14))
+        out["atr_norm"] = atr14 / (close + EPS)
+    if "bb_width" in wanted:
+        upper, middle, lower = safe_talib(talib.BBANDS, close, timeperiod=20, nbdevup=2, nbdevdn=2, matype=0)
+        out["bb_width"] = (upper - lower) / (middle + EPS)
+
+    # Momentum
+    if "rsi_14" in wanted:
+        out["rsi_14"] = _first_output(safe_talib(talib.RSI, close, timeperiod=14))
+
+    # Volume z-score (50-window) - robust or mean/std
+    if "volume_zscore_50" in wanted:
+        vol = pd.Series(volume)
+        if use_robust_volume_z:
+            out["volume_zscore_50"] = robust_zscore(vol, window=50).to_numpy()
+        else:
+            vol_mean_50 = vol.rolling(window=50, min_periods=1).mean()
+            vol_std_50 = vol.rolling(window=50, min_periods=1).std().replace(0, EPS)
+            out["volume_zscore_50"] = ((vol - vol_mean_50) / vol_std_50).to_numpy()
+
+    return {name: out[name] for name in BASE_FEATURES if name in out}
+
+
 def build_features(
     df: pd.DataFrame,
     main_tf: str = '5m',
@@ -580,67 +1031,37 @@ def build_features(
     if context_tfs is None:
         context_tfs = ['15m']
 
-    df_features = df.copy()
     all_tfs = [main_tf] + [tf for tf in context_tfs if tf != main_tf]
 
     # basic sanity check for main tf presence
     required_main = [f'close_{main_tf}', f'open_{main_tf}', f'high_{main_tf}', f'low_{main_tf}', f'volume_{main_tf}']
-    missing = [c for c in required_main if c not in df_features.columns]
+    missing = [c for c in required_main if c not in df.columns]
     if missing:
         raise ValueError(f"build_features: missing required main timeframe columns: {missing}")
 
+    # every indicator column is collected first and joined in one go,
+    # rather than inserted one at a time
+    new_columns = {}
     for tf in all_tfs:
-        close_col = f'close_{tf}'
-        high_col = f'high_{tf}'
-        low_col = f'low_{tf}'
-        open_col = f'open_{tf}'
-        vol_col = f'volume_{tf}'
-
-        if not all(c in df_features.columns for c in (close_col, high_col, low_col, open_col, vol_col)):
+        cols = [f'{c}_{tf}' for c in ('open', 'high', 'low', 'close', 'volume')]
+        if not all(c in df.columns for c in cols):
             # skip TF if columns not present
             continue
 
-        close = df_features[close_col].astype(float)
-        high = df_features[high_col].astype(float)
-        low = df_features[low_col].astype(float)
-        open_ = df_features[open_col].astype(float)
-        volume = df_features[vol_col].astype(float)
-
-        # Returns
-        df_features[f'log_ret_1_{tf}'] = np.log(close / close.shift(1) + EPS)
-
-        # Trend: EMA ratio 9/21
-        ema9 = pd.Series(safe_talib(talib.EMA, close.values, timeperiod=9), index=df_features.index)
-        ema21 = pd.Series(safe_talib(talib.EMA, close.values, timeperiod=21), index=df_features.index)
-        df_features[f'ema_ratio_9_21_{tf}'] = ema9 / (ema21 + EPS)
-
-        # MACD hist
-        macd, macd_signal, macd_hist = safe_talib(talib.MACD, close.values, 12, 26, 9)
-        df_features[f'macd_hist_{tf}'] = pd.Series(macd_hist, index=df_features.index)
-
-        # ADX
-        adx = pd.Series(safe_talib(talib.ADX, high.values, low.values, close.values, timeperiod=14), index=df_features.index)
-        df_features[f'adx_{tf}'] = adx
-
-        # Volatility: ATR normalized and BB width
-        atr14 = pd.Series(safe_talib(talib.ATR, high.values, low.values, close.values, timeperiod=14), index=df_features.index)
-        df_features[f'atr_norm_{tf}'] = atr14 / (close + EPS)
-        upper, middle, lower = safe_talib(talib.BBANDS, close.values, timeperiod=20, nbdevup=2, nbdevdn=2, matype=0)
-        upper_s = pd.Series(upper, index=df_features.index)
-        middle_s = pd.Series(middle, index=df_features.index)
-        lower_s = pd.Series(lower, index=df_features.index)
-        df_features[f'bb_width_{tf}'] = (upper_s - lower_s) / (middle_s + EPS)
-
-        # Momentum
-        df_features[f'rsi_14_{tf}'] = pd.Series(safe_talib(talib.RSI, close.values, timeperiod=14), index=df_features.index)
-
-        # Volume z-score (50-window) - robust or mean/std
-        if use_robust_volume_z:
-            df_features[f'volume_zscore_50_{tf}'] = robust_zscore(volume, window=50)
-        else:
-            vol_mean_50 = volume.rolling(window=50, min_periods=1).mean()
-            vol_std_50 = volume.rolling(window=50, min_periods=1).std().replace(0, EPS)
-            df_features[f'volume_zscore_50_{tf}'] = (volume - vol_mean_50) / vol_std_50
+        open_, high, low, close, volume = (_float_column(df, c) for c in cols)
+        for name, values in indicator_columns(open_, high, low, close, volume, use_robust_volume_z).items():
+            new_columns[f'{name}_{tf}'] = values
+
+    # new columns only ever go on the copy, so the input's data needn't be duplicated
+    df_features = df.copy(deep=False)
+    for name, values in new_columns.items():
+        if name in df_features.columns:
+            df_features[name] = values
+    added = {k: v for k, v in new_columns.items() if k not in df.columns}
+    if added:
+        df_features = pd.concat(
+            [df_features, pd.DataFrame(added, index=df_features.index, copy=False)], axis=1
+        )
 
     # Shift context features by 1 main bar to prevent lookahead bias
     # Select context-derived columns explicitly by suffix
@@ -649,7 +1070,7 @@ def build_features(
         suffix = f'_{tf}'
         cols = [
             c for c in df_features.columns
-            if c.endswith(suffix) and not any(c.startswith(prefix) for prefix in ('open_', 'high_', 'low_', 'close_', 'volume_'))
+            if c.endswith(suffix) and not c.startswith(OHLCV_PREFIXES)
         ]
         context_feature_cols.extend(cols)
 
@@ -663,3 +1084,109 @@ def build_features(
         df_features = df_features.reset_index(drop=True)
 
     return df_features
+
+
+def _is_context_column(name: str, context_tfs) -> bool:
+    # the columns build_features shifts by one main bar
+    return any(name.endswith(f'_{tf}') for tf in context_tfs) and not name.startswith(OHLCV_PREFIXES)
+
+
+def _nan_rows(isnan: np.ndarray, shifted: bool) -> np.ndarray:
+    if not shifted:
+        return isnan
+    out = np.empty_like(isnan)
+    out[:1] = True
+    out[1:] = isnan[:-1]
+    return out
+
+
+def build_feature_matrix(
+    df: pd.DataFrame,
+    feature_names: list,
+    main_tf: str = '5m',
+    context_tfs: Optional[list] = None,
+    use_robust_volume_z: bool = False,
+    dtype=np.float32,
+    dropna: bool = True
+) -> pd.DataFrame:
+    """
+    Just the `feature_names` columns of build_features, as one preallocated
+    C-contiguous (rows, features) array of `dtype` in a single-block frame
+    indexed by timestamp. Only the indicators those columns need are
+    computed, and each is written straight into its column.
+
+    frame.to_numpy() returns that array itself (read-only), so windows
+    sliced from it reach the predictor without another copy. With dropna,
+    the rows build_features(...).dropna() drops are dropped: NaN in any
+    input column or any indicator it computes, not just the requested
+    ones. For the usual leading warm-up rows that is a slice, not a copy.
+    """
+    if context_tfs is None:
+        context_tfs = ['15m']
+    all_tfs = [main_tf] + [tf for tf in context_tfs if tf != main_tf]
+
+    # feature name -> (timeframe, indicator)
+    plan = {}
+    for j, name in enumerate(feature_names):
+        for tf in all_tfs:
+            base = name[:-len(tf) - 1]
+            if name.endswith(f'_{tf}') and base in BASE_FEATURES:
+                plan.setdefault(tf, []).append((j, base))
+                break
+        else:
+            raise ValueError(f"build_feature_matrix: unsupported feature '{name}'")
+
+    n = len(df)
+    X = np.empty((n, len(feature_names)), dtype=dtype)
+    # rows build_features(...).dropna() would drop for columns not in X:
+    # NaN in any input column or in any other indicator it computes
+    dropped = np.zeros(n, dtype=bool)
+    computed = set()
+    for tf in all_tfs:
+        cols = [f'{c}_{tf}' for c in ('open', 'high', 'low', 'close', 'volume')]
+        missing = [c for c in cols if c not in df.columns]
+        if missing:
+            if tf in plan:
+                raise ValueError(f"build_feature_matrix: missing columns for timeframe {tf}: {missing}")
+            # build_features skips it too
+            continue
+        computed.update(f'{base}_{tf}' for base in BASE_FEATURES)
+
+        items = plan.get(tf, [])
+        wanted = {base for _, base in items}
+        if not wanted and not dropna:
+            continue
+        values = indicator_columns(
+            *(_float_column(df, c) for c in cols),
+            use_robust_volume_z=use_robust_volume_z,
+            only=BASE_FEATURES if dropna else wanted,
+        )
+        for j, base in items:
+            v = values[base]
+            if _is_context_column(f'{base}_{tf}', context_tfs):
+                # same one-bar context shift as build_features
+                X[:1, j] = np.nan
+                X[1:, j] = v[:-1]
+            else:
+                X[:, j] = v
+        if dropna:
+            for base, v in values.items():
+                if base not in wanted:
+                    dropped |= _nan_rows(np.isnan(v), _is_context_column(f'{base}_{tf}', context_tfs))
+
+    if dropna:
+        # input columns build_features doesn't overwrite
+        for col in df.columns:
+            if col not in computed:
+                dropped |= _nan_rows(df[col].isna().to_numpy(), _is_context_column(col, context_tfs))
+
+    index = pd.DatetimeIndex(df['timestamp']) if 'timestamp' in df.columns else pd.RangeIndex(n)
+    if dropna and n:
+        valid = ~np.isnan(X).any(axis=1) & ~dropped
+        first = int(valid.argmax()) if valid.any() else n
+        if valid[first:].all():
+            X, index = X[first:], index[first:]
+        else:
+            X, index = X[valid], index[valid]
+
+    return pd.DataFrame(X, index=index, columns=list(feature_names), copy=False)
@@ -1,27 +1,77 @@
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+import httpx
+import numpy as np
 import requests
 import pandas as pd
 
 BINANCE_BASE = "https://api.binance.com"
+KLINE_CACHE_DIR = Path("cache") / "klines"
 
-def fetch_klines(symbol: str, interval: str, limit: int = 300) -> pd.DataFrame:
+KLINE_COLUMNS = [
+    "open_time", "open", "high", "low", "close", "volume",
+    "close_time", "qav", "num_trades",
+    "taker_buy_base", "taker_buy_quote", "ignore"
+]
+
+INTERVAL_MS = {
+    "1m": 60_000,
+    "3m": 3 * 60_000,
+    "5m": 5 * 60_000,
+    "15m": 15 * 60_000,
+    "30m": 30 * 60_000,
+    "1h": 60 * 60_000,
+    "2h": 2 * 60 * 60_000,
+    "4h": 4 * 60 * 60_000,
+    "6h": 6 * 60 * 60_000,
+    "8h": 8 * 60 * 60_000,
+    "12h": 12 * 60 * 60_000,
+    "1d": 24 * 60 * 60_000,
+}
+
+# Binance caps a single klines request at 1000 bars
+MAX_KLINE_LIMIT = 1000
+
+# Binance spot REQUEST_WEIGHT budget is 6000/min per IP; keep some headroom
+DEFAULT_WEIGHT_PER_MINUTE = 5000
+
+
+def kline_request_weight(limit: int) -> int:
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+def fetch_raw_klines(
+    symbol: str,
+    interval: str,
+    limit: int = 300,
+    start_time: Optional[int] = None
+) -> list:
     url = f"{BINANCE_BASE}/api/v3/klines"
     params = {
         "symbol": symbol,
         "interval": interval,
         "limit": limit
     }
+    if start_time is not None:
+        params["startTime"] = int(start_time)
 
     r = requests.get(url, params=params, timeout=10)
     r.raise_for_status()
-    data = r.json()
+    return r.json()
 
-    cols = [
-        "open_time", "open", "high", "low", "close", "volume",
-        "close_time", "qav", "num_trades",
-        "taker_buy_base", "taker_buy_quote", "ignore"
-    ]
 
-    df = pd.DataFrame(data, columns=cols)
+def klines_to_frame(data: list) -> pd.DataFrame:
+    df = pd.DataFrame(data, columns=KLINE_COLUMNS)
 
     df["timestamp"] = pd.to_datetime(df["open_time"], unit="ms", utc=True)
     df["open"] = df["open"].astype(float)
@@ -32,31 +82,447 @@ def fetch_klines(symbol: str, interval: str, limit: int = 300) -> pd.DataFrame:
 
     return df[["timestamp", "open", "high", "low", "close", "volume"]]
 
-def merge_timeframes(df_5m: pd.DataFrame, df_15m: pd.DataFrame) -> pd.DataFrame:
-    df_5m = df_5m.copy()
-    df_15m = df_15m.copy()
 
-    df_5m = df_5m.rename(columns={
-        "open": "open_5m",
-        "high": "high_5m",
-        "low": "low_5m",
-        "close": "close_5m",
-        "volume": "volume_5m",
-    })
+def fetch_klines(symbol: str, interval: str, limit: int = 300) -> pd.DataFrame:
+    return klines_to_frame(fetch_raw_klines(symbol, interval, limit=limit))
+
+
+# -------------------------
+# Incremental kline store
+# -------------------------
+class KlineRingBuffer:
+    """
+    Fixed-capacity OHLCV buffer for one (symbol, interval).
+    Rows are [open_time_ms, open, high, low, close, volume] as float64.
+    """
+
+    N_FIELDS = 6
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = np.empty((capacity, self.N_FIELDS), dtype=np.float64)
+        self._start = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _slot(self, i: int) -> int:
+        return (self._start + i) % self.capacity
+
+    @property
+    def last_open_time(self) -> Optional[int]:
+        if self._size == 0:
+            return None
+        return int(self._data[self._slot(self._size - 1), 0])
+
+    def reset(self, rows: np.ndarray):
+        rows = rows[-self.capacity:]
+        self._data[:len(rows)] = rows
+        self._start = 0
+        self._size = len(rows)
+
+    def extend(self, rows: np.ndarray):
+        """
+        Append bars sorted by open_time. Bars older than the last stored one
+        are ignored; a bar with the same open_time replaces it (the last bar
+        is usually still open when it is first fetched).
+        """
+        if len(rows) == 0:
+            return
+        last = self.last_open_time
+        if last is None:
+            self.reset(rows)
+            return
 
-    df_15m = df_15m.rename(columns={
-        "open": "open_15m",
-        "high": "high_15m",
-        "low": "low_15m",
-        "close": "close_15m",
-        "volume": "volume_15m",
+        rows = rows[rows[:, 0] >= last]
+        if len(rows) and int(rows[0, 0]) == last:
+            self._data[self._slot(self._size - 1)] = rows[0]
+            rows = rows[1:]
+        if len(rows) == 0:
+            return
+        if len(rows) >= self.capacity:
+            self.reset(rows)
+            return
+
+        for row in rows:
+            if self._size < self.capacity:
+                self._data[self._slot(self._size)] = row
+                self._size += 1
+            else:
+                self._data[self._start] = row
+                self._start = (self._start + 1) % self.capacity
+
+    def to_array(self) -> np.ndarray:
+        """Ordered copy, oldest bar first."""
+        end = self._start + self._size
+        if end <= self.capacity:
+            return self._data[self._start:end].copy()
+        return np.concatenate(
+            (self._data[self._start:], self._data[:end - self.capacity])
+        )
+
+
+def _rows_to_array(data: list) -> np.ndarray:
+    if not data:
+        return np.empty((0, KlineRingBuffer.N_FIELDS), dtype=np.float64)
+    return np.array([row[:KlineRingBuffer.N_FIELDS] for row in data], dtype=np.float64)
+
+
+def _array_to_frame(arr: np.ndarray) -> pd.DataFrame:
+    return pd.DataFrame({
+        "timestamp": pd.to_datetime(arr[:, 0].astype(np.int64), unit="ms", utc=True),
+        "open": arr[:, 1],
+        "high": arr[:, 2],
+        "low": arr[:, 3],
+        "close": arr[:, 4],
+        "volume": arr[:, 5],
     })
 
-    merged = pd.merge_asof(
-        df_5m.sort_values("timestamp"),
-        df_15m.sort_values("timestamp"),
-        on="timestamp",
-        direction="backward"
-    )
 
-    return merged
+class KlineStore:
+    """
+    In-process kline cache keyed by (symbol, interval).
+
+    Each update only requests bars from the last stored open_time onwards
+    (re-fetching that bar, since it may have been open) and appends them to
+    a ring buffer. Buffers are snapshotted to `cache_dir` after every update
+    and reloaded from there on restart.
+    """
+
+    def __init__(self, capacity: int = 300, cache_dir: Optional[Path] = KLINE_CACHE_DIR):
+        if capacity > MAX_KLINE_LIMIT:
+            raise ValueError(f"capacity must be <= {MAX_KLINE_LIMIT}, got {capacity}")
+        self.capacity = capacity
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self._buffers: Dict[Tuple[str, str], KlineRingBuffer] = {}
+
+    def _snapshot_path(self, symbol: str, interval: str) -> Path:
+        return self.cache_dir / f"{symbol}_{interval}.npy"
+
+    def _buffer(self, symbol: str, interval: str) -> KlineRingBuffer:
+        key = (symbol, interval)
+        buf = self._buffers.get(key)
+        if buf is None:
+            buf = KlineRingBuffer(self.capacity)
+            snapshot = self._load_snapshot(symbol, interval)
+            if snapshot is not None:
+                buf.reset(snapshot)
+            self._buffers[key] = buf
+        return buf
+
+    def _load_snapshot(self, symbol: str, interval: str) -> Optional[np.ndarray]:
+        if self.cache_dir is None:
+            return None
+        path = self._snapshot_path(symbol, interval)
+        if not path.exists():
+            return None
+        try:
+            arr = np.load(path)
+        except Exception as e:
+            print(f"[KlineStore] Ignoring unreadable snapshot {path}: {e}")
+            return None
+        if arr.ndim != 2 or arr.shape[1] != KlineRingBuffer.N_FIELDS:
+            return None
+        return arr
+
+    def _save_snapshot(self, symbol: str, interval: str, buf: KlineRingBuffer):
+        if self.cache_dir is None:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._snapshot_path(symbol, interval)
+        tmp = path.with_suffix(".tmp")
+        with tmp.open("wb") as f:
+            np.save(f, buf.to_array())
+        os.replace(tmp, path)
+
+    def request_params(self, symbol: str, interval: str, now_ms: Optional[int] = None) -> dict:
+        """Binance klines query params needed to bring the buffer up to date."""
+        buf = self._buffer(symbol, interval)
+        last = buf.last_open_time
+        if last is None:
+            return {"limit": self.capacity}
+
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        # bars from the last stored one (inclusive) up to the one open now
+        pending = (now_ms - last) // INTERVAL_MS[interval] + 1
+        if pending >= self.capacity:
+            # gap is larger than the buffer: just take the latest window
+            return {"limit": self.capacity}
+        return {"limit": int(max(pending, 1)), "startTime": last}
+
+    def apply(self, symbol: str, interval: str, data: list):
+        """Append raw Binance kline rows and persist the snapshot."""
+        buf = self._buffer(symbol, interval)
+        buf.extend(_rows_to_array(data))
+        self._save_snapshot(symbol, interval, buf)
+
+    def update(self, symbol: str, interval: str) -> pd.DataFrame:
+        params = self.request_params(symbol, interval)
+        data = fetch_raw_klines(
+            symbol, interval,
+            limit=params["limit"],
+            start_time=params.get("startTime")
+        )
+        self.apply(symbol, interval, data)
+        return self.frame(symbol, interval)
+
+    def frame(self, symbol: str, interval: str) -> pd.DataFrame:
+        return _array_to_frame(self._buffer(symbol, interval).to_array())
+
+
+# -------------------------
+# Async fetching
+# -------------------------
+class RequestWeightLimiter:
+    """
+    Client-side view of Binance's per-minute request-weight window.
+    Weight is reserved before each request and re-synced from the
+    X-MBX-USED-WEIGHT-1M response header; a 429/418 Retry-After blocks
+    every caller until it expires.
+    """
+
+    def __init__(self, max_weight_per_minute: int = DEFAULT_WEIGHT_PER_MINUTE):
+        self.max_weight = max_weight_per_minute
+        self._minute = None
+        self._used = 0
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _roll(self, now: float):
+        minute = int(now // 60)
+        if minute != self._minute:
+            self._minute = minute
+            self._used = 0
+
+    async def acquire(self, weight: int):
+        async with self._lock:
+            while True:
+                now = time.time()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._roll(now)
+                if self._used + weight <= self.max_weight:
+                    self._used += weight
+                    return
+                # wait for the next minute window
+                await asyncio.sleep((self._minute + 1) * 60 - now)
+
+    def observe(self, headers: httpx.Headers):
+        used = headers.get("x-mbx-used-weight-1m")
+        if used is None:
+            return
+        try:
+            used = int(used)
+        except ValueError:
+            return
+        self._roll(time.time())
+        self._used = max(self._used, used)
+
+    def block(self, seconds: float):
+        self._blocked_until = max(self._blocked_until, time.time() + seconds)
+
+
+class AsyncKlineFetcher:
+    """
+    Concurrent klines fetcher over one pooled HTTP/1.1 client.
+
+    All (symbol, interval) requests of a cycle are issued together, bounded
+    by `max_concurrency` open requests to the host and by the request-weight
+    budget. `base_url` can point at a local stub server.
+
+        async with AsyncKlineFetcher() as fetcher:
+            frames = await fetcher.update_store(store, [("BTCUSDT", "5m"), ("BTCUSDT", "15m")])
+    """
+
+    def __init__(
+        self,
+        base_url: str = BINANCE_BASE,
+        max_concurrency: int = 10,
+        max_weight_per_minute: int = DEFAULT_WEIGHT_PER_MINUTE,
+        timeout: float = 10.0,
+        max_retries: int = 3,
+    ):
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.limiter = RequestWeightLimiter(max_weight_per_minute)
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency,
+            ),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def fetch_raw(
+        self,
+        symbol: str,
+        interval: str,
+        limit: int = 300,
+        start_time: Optional[int] = None
+    ) -> list:
+        params = {
+            "symbol": symbol,
+            "interval": interval,
+            "limit": limit
+        }
+        if start_time is not None:
+            params["startTime"] = int(start_time)
+
+        weight = kline_request_weight(limit)
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(weight)
+            async with self._semaphore:
+                r = await self._client.get("/api/v3/klines", params=params)
+            self.limiter.observe(r.headers)
+
+            if r.status_code in (418, 429) and attempt < self.max_retries:
+                retry_after = float(r.headers.get("retry-after", 2 ** attempt))
+                print(f"[AsyncKlineFetcher] {r.status_code} for {symbol} {interval}, retrying in {retry_after:.0f}s")
+                self.limiter.block(retry_after)
+                continue
+
+            r.raise_for_status()
+            return r.json()
+
+    async def fetch_klines(self, symbol: str, interval: str, limit: int = 300) -> pd.DataFrame:
+        return klines_to_frame(await self.fetch_raw(symbol, interval, limit=limit))
+
+    async def update_store(self, store: KlineStore, pairs: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], object]:
+        """
+        Bring every (symbol, interval) in `pairs` up to date concurrently.
+        Returns {(symbol, interval): DataFrame or the Exception raised}.
+        """
+        pairs = list(pairs)
+
+        async def one(symbol: str, interval: str):
+            params = store.request_params(symbol, interval)
+            data = await self.fetch_raw(
+                symbol, interval,
+                limit=params["limit"],
+                start_time=params.get("startTime")
+            )
+            store.apply(symbol, interval, data)
+            return store.frame(symbol, interval)
+
+        results = await asyncio.gather(
+            *(one(symbol, interval) for symbol, interval in pairs),
+            return_exceptions=True
+        )
+        return dict(zip(pairs, results))
+
+
+OHLCV_FIELDS = ("open", "high", "low", "close", "volume")
+
+
+def _epoch_ms(df: pd.DataFrame) -> np.ndarray:
+    return df["timestamp"].array.as_unit("ms").asi8
+
+
+def _sorted_by_time(df: pd.DataFrame, ts: np.ndarray):
+    # klines arrive sorted; only pay for a sort when they don't
+    if len(ts) > 1 and (np.diff(ts) <= 0).any():
+        df = df.sort_values("timestamp", kind="stable").drop_duplicates("timestamp", keep="last")
+        ts = _epoch_ms(df)
+    return df, ts
+
+
+def context_bar_index(main_ts: np.ndarray, ctx_ts: np.ndarray, main_ms: int, ctx_ms: int,
+                      closed_only: bool = False) -> np.ndarray:
+    """
+    Row of `ctx_ts` (sorted open times) each main bar maps to, -1 if none.
+
+    By default that is the context bar containing the main bar's open time,
+    as merge_asof(direction="backward") picks. With `closed_only`, it is the
+    newest context bar that has closed by the time the main bar closes.
+    Context bars missing from `ctx_ts` fall back to the newest earlier one.
+    """
+    m = len(ctx_ts)
+    if m == 0:
+        return np.full(len(main_ts), -1, dtype=np.int64)
+
+    # latest context open time a main bar may use
+    limit = main_ts + main_ms - ctx_ms if closed_only else main_ts
+    if ctx_ts[0] % ctx_ms == 0 and ctx_ts[-1] - ctx_ts[0] == (m - 1) * ctx_ms:
+        # contiguous grid aligned to the epoch: the row is plain arithmetic
+        idx = ((limit - ctx_ts[0]) // ctx_ms).astype(np.int64)
+        idx[idx >= m] = m - 1
+    else:
+        idx = np.searchsorted(ctx_ts, limit, side="right") - 1
+    idx[idx < 0] = -1
+    return idx
+
+
+def merge_timeframes(
+    df_main: pd.DataFrame,
+    *context_frames: pd.DataFrame,
+    main_tf: str = "5m",
+    context_tfs: Optional[Iterable[str]] = None,
+    closed_only: bool = False,
+) -> pd.DataFrame:
+    """
+    Join context-timeframe klines onto the main timeframe's rows:
+    merge_timeframes(df_5m, df_15m), or e.g.
+    merge_timeframes(df_5m, df_15m, df_1h, context_tfs=["15m", "1h"]).
+
+    Columns come out as <field>_<tf>, one row per main bar. Other context
+    columns keep their name, or get the _<tf> suffix too if it is taken. Rows are matched
+    by epoch arithmetic on the open times (see context_bar_index), so sorted
+    input is neither sorted again nor copied; only the context columns are
+    gathered. `closed_only` uses only context bars that closed by the main
+    bar's close. The default matches the merge_asof alignment the model was
+    trained on: a main bar sees its containing context bar (build_features
+    then shifts context features by one bar).
+    """
+    context_tfs = ["15m"] if context_tfs is None else list(context_tfs)
+    if len(context_tfs) != len(context_frames):
+        raise ValueError(f"Got {len(context_frames)} context frames for timeframes {context_tfs}")
+
+    main_ts = _epoch_ms(df_main)
+    df_main, main_ts = _sorted_by_time(df_main, main_ts)
+
+    # rename is copy-on-write: the main columns aren't duplicated, and writes
+    # to the merged frame still don't reach the caller's frame
+    merged = df_main.rename(columns={c: f"{c}_{main_tf}" for c in OHLCV_FIELDS}).reset_index(drop=True)
+
+    gathered = {}
+    for tf, df_ctx in zip(context_tfs, context_frames):
+        ctx_ts = _epoch_ms(df_ctx)
+        df_ctx, ctx_ts = _sorted_by_time(df_ctx, ctx_ts)
+        idx = context_bar_index(main_ts, ctx_ts, INTERVAL_MS[main_tf], INTERVAL_MS[tf], closed_only)
+        missing = idx < 0
+        for col in df_ctx.columns:
+            if col == "timestamp":
+                continue
+            name = col
+            if col in OHLCV_FIELDS or col in merged.columns or col in gathered:
+                # other columns keep their name unless it's taken
+                name = f"{col}_{tf}"
+            if name in merged.columns or name in gathered:
+                raise ValueError(f"merge_timeframes: {tf} column '{col}' clashes with '{name}'")
+            if len(ctx_ts) == 0:
+                # nothing to match against: all-NaN columns, as merge_asof gives
+                gathered[name] = np.full(len(main_ts), np.nan)
+            elif col in OHLCV_FIELDS:
+                values = df_ctx[col].to_numpy(dtype=np.float64)[idx]
+                values[missing] = np.nan
+                gathered[name] = values
+            else:
+                gathered[name] = df_ctx[col].take(idx).where(~missing).array
+
+    if not gathered:
+        return merged
+    return pd.concat([merged, pd.DataFrame(gathered, index=merged.index, copy=False)], axis=1)
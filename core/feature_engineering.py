@@ -4,35 +4,37 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import numpy as np
 import pandas as pd
-from core.compute_features import build_features
+from core.compute_features import build_feature_matrix
 
 def build_lstm_input(
     merged_ohlcv_df: pd.DataFrame,
     feature_names: list,
-    time_steps: int
+    time_steps: int,
+    dtype=np.float32
 ) -> np.ndarray:
     """
     Returns np.ndarray of shape (time_steps, n_features)
+
+    Only the model features are computed, into one `dtype` matrix, and the
+    window is a read-only view of its last rows.
     """
 
-    # Compute features using SAME logic as training
-    features_df = build_features(
+    # Compute features using SAME logic as training,
+    # selected & ordered EXACTLY as metadata
+    X = build_feature_matrix(
         merged_ohlcv_df,
+        feature_names,
         main_tf="5m",
         context_tfs=["15m"],
+        dtype=dtype,
         dropna=True
-    )
+    ).to_numpy()
 
-    if len(features_df) < time_steps:
+    if len(X) < time_steps:
         raise ValueError(
             f"Not enough rows after feature engineering. "
-            f"Need {time_steps}, got {len(features_df)}"
+            f"Need {time_steps}, got {len(X)}"
         )
 
     # Select last N rows
-    window = features_df.iloc[-time_steps:]
-
-    # Select & order columns EXACTLY as metadata
-    X = window[feature_names].to_numpy(dtype=np.float32)
-
-    return X
+    return X[-time_steps:]
@@ -0,0 +1,590 @@
+# core/incremental_features.py
+"""
+Streaming (O(1) per bar) versions of the indicators in build_features.
+
+Each indicator keeps the same recursive state TA-Lib uses internally
+(SMA-seeded EMAs, Wilder smoothing, running window sums) and replays the
+same arithmetic, so when fed the same rows as a build_features call it
+reproduces the batch columns exactly. The live worker feeds a sliding
+kline window whose first bar moves every cycle, so the batch path re-seeds
+its EMAs/Wilder sums on a different bar each time; with a 300-bar window
+the two then agree within FEATURE_RTOL/FEATURE_ATOL (np.allclose) on every
+model feature, the residual being the batch path's own seed transient
+(checked by `python -m bench.parity`).
+"""
+import copy
+import math
+from bisect import bisect_left, insort
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from core.compute_features import BASE_FEATURES, EPS
+from core.data_fetcher import INTERVAL_MS
+
+NAN = float("nan")
+
+# tolerance vs the talib batch path on a sliding 300-bar window
+FEATURE_RTOL = 1e-4
+FEATURE_ATOL = 1e-4
+
+
+def _is_zero(x: float) -> bool:
+    # TA_IS_ZERO
+    return -0.00000001 < x < 0.00000001
+
+
+# -------------------------
+# Indicator state
+# -------------------------
+class EMA:
+    """talib.EMA: seeded with the SMA of the first `period` inputs."""
+
+    __slots__ = ("period", "k", "count", "seed_sum", "value")
+
+    def __init__(self, period: int):
+        self.period = period
+        self.k = 2.0 / (period + 1)
+        self.count = 0
+        self.seed_sum = 0.0
+        self.value = NAN
+
+    def update(self, x: float) -> float:
+        if self.count < self.period:
+            self.seed_sum += x
+            self.count += 1
+            if self.count == self.period:
+                self.value = self.seed_sum / self.period
+            return self.value
+        self.value = ((x - self.value) * self.k) + self.value
+        return self.value
+
+
+class MACDHist:
+    """
+    talib.MACD(12, 26, 9) histogram. TA-Lib seeds the fast EMA on the
+    inputs that end where the slow EMA's seed ends, not on the first inputs.
+    """
+
+    __slots__ = ("slow_period", "fast_offset", "count", "fast", "slow", "signal")
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self.slow_period = slow
+        self.fast_offset = slow - fast
+        self.count = 0
+        self.fast = EMA(fast)
+        self.slow = EMA(slow)
+        self.signal = EMA(signal)
+
+    def update(self, x: float) -> float:
+        slow = self.slow.update(x)
+        fast = self.fast.update(x) if self.count >= self.fast_offset else NAN
+        self.count += 1
+        if self.count < self.slow_period:
+            return NAN
+        macd = fast - slow
+        signal = self.signal.update(macd)
+        return macd - signal
+
+
+class SMAStdDev:
+    """talib.BBANDS(SMA) middle band and stddev, kept as running sums."""
+
+    __slots__ = ("period", "window", "total", "total2")
+
+    def __init__(self, period: int = 20):
+        self.period = period
+        self.window = deque(maxlen=period)
+        self.total = 0.0
+        self.total2 = 0.0
+
+    def update(self, x: float) -> Tuple[float, float]:
+        self.window.append(x)
+        self.total += x
+        self.total2 += x * x
+        if len(self.window) < self.period:
+            return NAN, NAN
+
+        oldest = self.window[0]
+        middle = self.total / self.period
+        self.total -= oldest
+        mean2 = self.total2 / self.period
+        self.total2 -= oldest * oldest
+        mean2 -= middle * middle
+        std = math.sqrt(mean2) if mean2 >= 0.00000001 else 0.0
+        return middle, std
+
+
+class ATR:
+    """talib.ATR: SMA of the first `period` true ranges, then Wilder smoothing."""
+
+    __slots__ = ("period", "prev_close", "count", "tr_sum", "value")
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.prev_close = None
+        self.count = 0
+        self.tr_sum = 0.0
+        self.value = NAN
+
+    def update(self, high: float, low: float, close: float) -> float:
+        prev_close = self.prev_close
+        self.prev_close = close
+        if prev_close is None:
+            return NAN
+
+        tr = high - low
+        v = abs(prev_close - high)
+        if v > tr:
+            tr = v
+        v = abs(low - prev_close)
+        if v > tr:
+            tr = v
+
+        if self.count < self.period:
+            self.tr_sum += tr
+            self.count += 1
+            if self.count == self.period:
+                self.value = self.tr_sum / self.period
+            return self.value
+
+        self.value = (self.value * (self.period - 1) + tr) / self.period
+        return self.value
+
+
+class ADX:
+    """talib.ADX: Wilder-smoothed +DM/-DM/TR, ADX seeded with the mean of `period` DX values."""
+
+    __slots__ = (
+        "period", "prev_high", "prev_low", "prev_close", "count",
+        "plus_dm", "minus_dm", "tr", "sum_dx", "value",
+    )
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.prev_high = None
+        self.prev_low = None
+        self.prev_close = None
+        self.count = 0
+        self.plus_dm = 0.0
+        self.minus_dm = 0.0
+        self.tr = 0.0
+        self.sum_dx = 0.0
+        self.value = NAN
+
+    def update(self, high: float, low: float, close: float) -> float:
+        if self.prev_high is None:
+            self.prev_high, self.prev_low, self.prev_close = high, low, close
+            return NAN
+
+        diff_p = high - self.prev_high
+        diff_m = self.prev_low - low
+        prev_close = self.prev_close
+        self.prev_high, self.prev_low, self.prev_close = high, low, close
+
+        tr = high - low
+        v = abs(high - prev_close)
+        if v > tr:
+            tr = v
+        v = abs(low - prev_close)
+        if v > tr:
+            tr = v
+
+        n = self.period
+        self.count += 1
+        if self.count < n:
+            # accumulate the first period-1 bars without smoothing
+            if diff_m > 0 and diff_p < diff_m:
+                self.minus_dm += diff_m
+            elif diff_p > 0 and diff_p > diff_m:
+                self.plus_dm += diff_p
+            self.tr += tr
+            return NAN
+
+        self.minus_dm -= self.minus_dm / n
+        self.plus_dm -= self.plus_dm / n
+        if diff_m > 0 and diff_p < diff_m:
+            self.minus_dm += diff_m
+        elif diff_p > 0 and diff_p > diff_m:
+            self.plus_dm += diff_p
+        self.tr = self.tr - (self.tr / n) + tr
+
+        dx = None
+        if not _is_zero(self.tr):
+            minus_di = 100.0 * (self.minus_dm / self.tr)
+            plus_di = 100.0 * (self.plus_dm / self.tr)
+            di_sum = minus_di + plus_di
+            if not _is_zero(di_sum):
+                dx = 100.0 * (abs(minus_di - plus_di) / di_sum)
+
+        if self.count < 2 * n - 1:
+            if dx is not None:
+                self.sum_dx += dx
+            return NAN
+        if self.count == 2 * n - 1:
+            if dx is not None:
+                self.sum_dx += dx
+            self.value = self.sum_dx / n
+            return self.value
+
+        if dx is not None:
+            self.value = ((self.value * (n - 1)) + dx) / n
+        return self.value
+
+
+class RSI:
+    """talib.RSI: mean gain/loss over the first `period` changes, then Wilder smoothing."""
+
+    __slots__ = ("period", "prev", "count", "gain", "loss")
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.prev = None
+        self.count = 0
+        self.gain = 0.0
+        self.loss = 0.0
+
+    def update(self, x: float) -> float:
+        prev = self.prev
+        self.prev = x
+        if prev is None:
+            return NAN
+
+        diff = x - prev
+        n = self.period
+        if self.count < n:
+            if diff < 0:
+                self.loss -= diff
+            else:
+                self.gain += diff
+            self.count += 1
+            if self.count < n:
+                return NAN
+            self.loss /= n
+            self.gain /= n
+        else:
+            self.loss *= (n - 1)
+            self.gain *= (n - 1)
+            if diff < 0:
+                self.loss -= diff
+            else:
+                self.gain += diff
+            self.loss /= n
+            self.gain /= n
+
+        total = self.gain + self.loss
+        return 100.0 * (self.gain / total) if not _is_zero(total) else 0.0
+
+
+class RollingZScore:
+    """
+    (x - mean) / std over the last `window` values with min_periods=1 and
+    ddof=1, like the volume z-score in build_features. Uses Welford
+    add/remove updates so the per-bar cost does not depend on the window.
+    """
+
+    __slots__ = ("window", "values", "mean", "m2")
+
+    def __init__(self, window: int = 50):
+        self.window = window
+        self.values = deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, x: float) -> float:
+        if math.isnan(x):
+            return NAN
+        if len(self.values) == self.window:
+            old = self.values.popleft()
+            n = len(self.values)
+            if n == 0:
+                self.mean = 0.0
+                self.m2 = 0.0
+            else:
+                delta = old - self.mean
+                self.mean -= delta / n
+                self.m2 -= delta * (old - self.mean)
+
+        self.values.append(x)
+        n = len(self.values)
+        delta = x - self.mean
+        self.mean += delta / n
+        self.m2 += delta * (x - self.mean)
+
+        if n < 2:
+            return NAN
+        var = self.m2 / (n - 1)
+        std = math.sqrt(var) if var > 0 else 0.0
+        if std == 0:
+            std = EPS
+        return (x - self.mean) / std
+
+
+class RollingMedianMAD:
+    """
+    Rolling median and median absolute deviation over the last `window`
+    values with min_periods=1, like rolling_median_mad in compute_features
+    (a window holding a NaN gives NaN).
+
+    The window is kept sorted (O(log w) search per insert/remove). The MAD
+    is the k-th smallest distance to the median. It is selected by binary
+    search over the two sorted runs on either side of the median, so the
+    deviations are never materialized or sorted.
+    """
+
+    __slots__ = ("window", "values", "sorted", "nans")
+
+    def __init__(self, window: int = 50):
+        self.window = window
+        self.values = deque()
+        self.sorted: List[float] = []
+        self.nans = 0
+
+    def _kth_deviation(self, med: float, split: int, k: int) -> float:
+        # a[:split] < med <= a[split:]; distances grow walking outwards from split
+        a = self.sorted
+        n_right = len(a) - split
+        lo, hi = max(0, k + 1 - n_right), min(k + 1, split)
+        # smallest i such that the k+1 nearest values are i from the left run
+        while lo < hi:
+            i = (lo + hi) // 2
+            if med - a[split - 1 - i] < a[split + k - i] - med:
+                lo = i + 1
+            else:
+                hi = i
+        i, j = lo, k + 1 - lo
+        left = med - a[split - i] if i > 0 else -math.inf
+        right = a[split + j - 1] - med if j > 0 else -math.inf
+        return max(left, right)
+
+    def update(self, x: float) -> Tuple[float, float]:
+        if len(self.values) == self.window:
+            old = self.values.popleft()
+            if math.isnan(old):
+                self.nans -= 1
+            else:
+                del self.sorted[bisect_left(self.sorted, old)]
+
+        self.values.append(x)
+        if math.isnan(x):
+            self.nans += 1
+        else:
+            insort(self.sorted, x)
+        if self.nans:
+            return NAN, NAN
+
+        a = self.sorted
+        n = len(a)
+        h = n // 2
+        if n % 2:
+            med = a[h]
+            split = bisect_left(a, med)
+            return med, self._kth_deviation(med, split, h)
+        med = (a[h - 1] + a[h]) / 2
+        split = bisect_left(a, med)
+        mad = (self._kth_deviation(med, split, h - 1) + self._kth_deviation(med, split, h)) / 2
+        return med, mad
+
+
+class RollingRobustZScore:
+    """(x - median) / (1.4826 * MAD) over the last `window` values, like robust_zscore."""
+
+    __slots__ = ("stats",)
+
+    def __init__(self, window: int = 50):
+        self.stats = RollingMedianMAD(window)
+
+    def update(self, x: float) -> float:
+        med, mad = self.stats.update(x)
+        return (x - med) / (mad * 1.4826 + EPS)
+
+
+class TimeframeIndicators:
+    """All BASE_FEATURES for one timeframe's OHLCV columns."""
+
+    def __init__(self, robust_volume_z: bool = False):
+        self.prev_close = None
+        self.ema9 = EMA(9)
+        self.ema21 = EMA(21)
+        self.macd = MACDHist(12, 26, 9)
+        self.adx = ADX(14)
+        self.atr = ATR(14)
+        self.bbands = SMAStdDev(20)
+        self.rsi = RSI(14)
+        self.volume_z = RollingRobustZScore(50) if robust_volume_z else RollingZScore(50)
+        self.started = False
+
+    def update(self, open_: float, high: float, low: float, close: float, volume: float) -> Tuple[float, ...]:
+        # talib starts every indicator at the first row without NaN inputs
+        if not self.started:
+            if any(math.isnan(v) for v in (open_, high, low, close, volume)):
+                return (NAN,) * len(BASE_FEATURES)
+            self.started = True
+
+        prev_close = self.prev_close
+        self.prev_close = close
+        log_ret = math.log(close / prev_close + EPS) if prev_close is not None else NAN
+
+        ema9 = self.ema9.update(close)
+        ema21 = self.ema21.update(close)
+        macd_hist = self.macd.update(close)
+        adx = self.adx.update(high, low, close)
+        atr = self.atr.update(high, low, close)
+        middle, std = self.bbands.update(close)
+        rsi = self.rsi.update(close)
+        volume_z = self.volume_z.update(volume)
+
+        dev = std * 2
+        upper = middle + dev
+        lower = middle - dev
+
+        return (
+            log_ret,
+            ema9 / (ema21 + EPS),
+            macd_hist,
+            adx,
+            atr / (close + EPS),
+            (upper - lower) / (middle + EPS),
+            rsi,
+            volume_z,
+        )
+
+
+# -------------------------
+# Engine
+# -------------------------
+class StreamingFeatureEngine:
+    """
+    Maintains indicator state for one symbol's merged multi-timeframe frame
+    and returns the last `time_steps` model feature rows, matching
+    build_lstm_input.
+
+    A row is committed into a timeframe's state only once the exchange has
+    rolled past that timeframe's bar, i.e. the frame holds a main bar that
+    opened at or after its close; the local clock isn't trusted, since a
+    bar whose close time has passed may still be the exchange's newest one.
+    Rows whose bar is still open (the newest 5m bar, and the 5m rows that
+    map onto the newest 15m bar) are evaluated on a throwaway copy of the
+    state every call, which costs a handful of bars at most.
+    """
+
+    def __init__(
+        self,
+        feature_names: Sequence[str],
+        time_steps: int,
+        main_tf: str = "5m",
+        context_tfs: Optional[Sequence[str]] = None,
+        robust_volume_z: bool = False,
+    ):
+        if context_tfs is None:
+            context_tfs = ["15m"]
+        self.robust_volume_z = robust_volume_z
+        self.feature_names = list(feature_names)
+        self.time_steps = time_steps
+        self.main_tf = main_tf
+        self.context_tfs = [tf for tf in context_tfs if tf != main_tf]
+        self.all_tfs = [main_tf] + self.context_tfs
+
+        self._columns: List[Tuple[str, int]] = []
+        for name in self.feature_names:
+            self._columns.append(self._locate(name))
+
+        self.reset()
+
+    def _locate(self, name: str) -> Tuple[str, int]:
+        for tf in self.all_tfs:
+            suffix = f"_{tf}"
+            if name.endswith(suffix):
+                base = name[: -len(suffix)]
+                if base in BASE_FEATURES:
+                    return tf, BASE_FEATURES.index(base)
+        raise ValueError(f"StreamingFeatureEngine: unsupported feature '{name}'")
+
+    def reset(self):
+        self._state: Dict[str, TimeframeIndicators] = {
+            tf: TimeframeIndicators(self.robust_volume_z) for tf in self.all_tfs
+        }
+        self._committed_ts: Dict[str, Optional[int]] = {tf: None for tf in self.all_tfs}
+        # committed feature rows per timeframe, one extra for the context shift
+        self._rows: Dict[str, deque] = {tf: deque(maxlen=self.time_steps + 1) for tf in self.all_tfs}
+
+    def _needs_reset(self, ts: np.ndarray) -> bool:
+        step = INTERVAL_MS[self.main_tf]
+        for tf in self.all_tfs:
+            last = self._committed_ts[tf]
+            if last is None:
+                continue
+            if last < ts[0] or last > ts[-1]:
+                return True
+            pos = np.searchsorted(ts, last)
+            if pos >= len(ts) or ts[pos] != last:
+                return True
+            if pos + 1 < len(ts) and ts[pos + 1] != last + step:
+                return True
+        return False
+
+    def update(self, merged: pd.DataFrame) -> np.ndarray:
+        """
+        merged: output of merge_timeframes (sorted, main_tf cadence).
+        Returns np.ndarray of shape (time_steps, n_features), float32.
+        """
+        ts = merged["timestamp"].dt.as_unit("ms").astype(np.int64).to_numpy()
+        if len(ts) == 0:
+            raise ValueError("StreamingFeatureEngine: empty frame")
+        # bars closing after the newest bar's open haven't been rolled yet
+        rolled_to = int(ts[-1])
+        if self._needs_reset(ts):
+            self.reset()
+
+        main_ms = INTERVAL_MS[self.main_tf]
+        pending: Dict[str, list] = {}
+        for tf in self.all_tfs:
+            cols = [f"{c}_{tf}" for c in ("open", "high", "low", "close", "volume")]
+            if not all(c in merged.columns for c in cols):
+                raise ValueError(f"StreamingFeatureEngine: missing columns for timeframe {tf}")
+
+            last = self._committed_ts[tf]
+            start = 0 if last is None else int(np.searchsorted(ts, last, side="right"))
+            ohlcv = merged[cols].to_numpy(dtype=np.float64)[start:]
+            tf_ms = INTERVAL_MS[tf]
+
+            state = self._state[tf]
+            rows = self._rows[tf]
+            provisional = []
+            scratch = None
+            for i, t in enumerate(ts[start:]):
+                t = int(t)
+                # the tf bar this main bar belongs to closes at its grid boundary
+                closes_at = (t // tf_ms) * tf_ms + tf_ms if tf != self.main_tf else t + main_ms
+                if scratch is None and closes_at <= rolled_to:
+                    rows.append((t, state.update(*ohlcv[i])))
+                    self._committed_ts[tf] = t
+                else:
+                    if scratch is None:
+                        scratch = copy.deepcopy(state)
+                    provisional.append((t, scratch.update(*ohlcv[i])))
+            pending[tf] = list(rows) + provisional
+
+        n_needed = self.time_steps + 1
+        out = np.empty((self.time_steps, len(self.feature_names)), dtype=np.float32)
+        for tf in self.all_tfs:
+            if len(pending[tf]) < n_needed:
+                raise ValueError(
+                    f"Not enough rows for streaming features. "
+                    f"Need {n_needed}, got {len(pending[tf])}"
+                )
+
+        main_rows = pending[self.main_tf][-self.time_steps:]
+        for j, (tf, idx) in enumerate(self._columns):
+            if tf == self.main_tf:
+                src = main_rows
+            else:
+                # context features are shifted by one main bar (no lookahead)
+                src = pending[tf][-n_needed:-1]
+            out[:, j] = [r[1][idx] for r in src]
+
+        if np.isnan(out).any():
+            raise ValueError("Streaming feature window still contains NaN (not enough warm-up history)")
+        return out
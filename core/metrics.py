@@ -0,0 +1,141 @@
+# core/metrics.py
+"""
+Minimal latency histograms in Prometheus text format.
+
+    with timed("regime_worker_stage_seconds", stage="fetch"):
+        ...
+
+Set REGIME_METRICS=0 to turn recording off; `timed` then returns a shared
+no-op context manager, so instrumented code pays one function call.
+The worker writes its registry to METRICS_FILE every cycle and the API
+serves that file together with its own metrics on /metrics.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, Tuple
+
+METRICS_ENABLED = os.getenv("REGIME_METRICS", "1") != "0"
+METRICS_FILE = Path(os.getenv("REGIME_METRICS_FILE", "metrics_worker.prom"))
+
+# seconds; le="+Inf" is implicit
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_str(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one series per label set."""
+
+    def __init__(self, name: str, help_text: str = "", buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # labels -> [bucket counts..., +Inf count], sum
+        self._series: Dict[Tuple[Tuple[str, str], ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, list(counts), total) for k, (counts, total) in self._series.items()]
+        for labels, counts, total in sorted(items):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _label_str(labels, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            cumulative += counts[-1]
+            le = _label_str(labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_str(labels)} {total}")
+            lines.append(f"{self.name}_count{_label_str(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Histogram] = {}
+
+    def histogram(self, name: str, help_text: str = "", buckets=DEFAULT_BUCKETS) -> Histogram:
+        h = self._histograms.get(name)
+        if h is None:
+            with self._lock:
+                h = self._histograms.setdefault(name, Histogram(name, help_text, buckets))
+        return h
+
+    def render(self, prefix: str = "") -> str:
+        return "".join(
+            h.render() for name, h in list(self._histograms.items()) if name.startswith(prefix)
+        )
+
+    def write(self, path: Path = METRICS_FILE):
+        # tmp + rename so the API never serves a half-written file
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(self.render())
+        os.replace(tmp, path)
+
+
+registry = Registry()
+
+
+# -------------------------
+# Timing helpers
+# -------------------------
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopTimer()
+
+
+def timed(name: str, help_text: str = "", **labels):
+    """Context manager observing the block's wall time into histogram `name`."""
+    if not METRICS_ENABLED:
+        return _NOOP
+    return _Timer(registry.histogram(name, help_text), labels)
+
+
+def observe(name: str, value: float, help_text: str = "", **labels):
+    if METRICS_ENABLED:
+        registry.histogram(name, help_text).observe(value, **labels)
@@ -0,0 +1,197 @@
+# core/numpy_lstm.py
+"""
+NumPy forward pass for the regime LSTM, so inference does not need
+TensorFlow at runtime.
+
+`export_weights` (needs keras, run once per trained model) writes the
+layer stack and weights of a Sequential LSTM/Dense/Dropout model, plus the
+input StandardScaler's mean/scale, to an .npz archive; `NumpyLSTMModel`
+loads that archive and reproduces `model.predict` in float32.
+
+    python -m core.numpy_lstm export
+"""
+import argparse
+import json
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+    "tanh": np.tanh,
+    # tanh form of the logistic: no overflow for large negative inputs
+    "sigmoid": lambda x: 0.5 * (1.0 + np.tanh(0.5 * x)),
+}
+
+
+def _activate(name: str, x: np.ndarray) -> np.ndarray:
+    if name == "softmax":
+        e = np.exp(x - x.max(axis=-1, keepdims=True))
+        return e / e.sum(axis=-1, keepdims=True)
+    fn = ACTIVATIONS.get(name)
+    if fn is None:
+        raise ValueError(f"numpy_lstm: unsupported activation '{name}'")
+    return fn(x)
+
+
+# -------------------------
+# Export (keras -> npz)
+# -------------------------
+def export_weights(model_path, out_path, scaler_path=None):
+    """
+    Write a Sequential LSTM/Dense model's layer config and weights to
+    `out_path` (.npz), with the fitted StandardScaler at `scaler_path` if given.
+    """
+    from tensorflow.keras.models import load_model
+
+    model = load_model(model_path)
+    layers = []
+    arrays: Dict[str, np.ndarray] = {}
+
+    for layer in model.layers:
+        kind = type(layer).__name__
+        cfg = layer.get_config()
+        if kind == "Dropout":
+            continue
+        if kind == "LSTM":
+            if cfg.get("go_backwards") or cfg.get("stateful"):
+                raise ValueError("numpy_lstm: go_backwards/stateful LSTMs are not supported")
+            kernel, recurrent, bias = layer.get_weights()
+            spec = {
+                "type": "lstm",
+                "units": cfg["units"],
+                "activation": cfg["activation"],
+                "recurrent_activation": cfg["recurrent_activation"],
+                "return_sequences": cfg["return_sequences"],
+            }
+            weights = {"kernel": kernel, "recurrent_kernel": recurrent, "bias": bias}
+        elif kind == "Dense":
+            w = layer.get_weights()
+            spec = {"type": "dense", "units": cfg["units"], "activation": cfg["activation"]}
+            weights = {"kernel": w[0], "bias": w[1] if len(w) > 1 else np.zeros(cfg["units"], np.float32)}
+        else:
+            raise ValueError(f"numpy_lstm: unsupported layer type '{kind}'")
+
+        i = len(layers)
+        layers.append(spec)
+        for name, arr in weights.items():
+            arrays[f"{i}_{name}"] = np.asarray(arr, dtype=np.float32)
+
+    if scaler_path is not None:
+        import joblib
+        scaler = joblib.load(scaler_path)
+        n_in = model.input_shape[-1]
+        mean = scaler.mean_ if scaler.with_mean else np.zeros(n_in)
+        scale = scaler.scale_ if scaler.with_std else np.ones(n_in)
+        arrays["input_mean"] = np.asarray(mean, dtype=np.float64)
+        arrays["input_scale"] = np.asarray(scale, dtype=np.float64)
+
+    np.savez(out_path, config=np.array(json.dumps({"layers": layers})), **arrays)
+    print(f"[numpy_lstm] Exported {len(layers)} layers -> {out_path}")
+
+
+# -------------------------
+# Forward pass
+# -------------------------
+class NumpyLSTMModel:
+    """
+    Inference-only replica of the exported Keras model.
+
+    The LSTM follows Keras: gates packed as [i, f, c, o] along the last
+    axis of kernel/recurrent_kernel/bias; the input projection for all
+    timesteps is a single matmul ahead of the recurrence.
+    """
+
+    def __init__(self, path):
+        with np.load(path) as archive:
+            self.layers: List[dict] = json.loads(str(archive["config"]))["layers"]
+            self.weights = {k: archive[k] for k in archive.files if k != "config"}
+        mean = self.weights.pop("input_mean", None)
+        scale = self.weights.pop("input_scale", None)
+        # scaler stats exported alongside the weights, (mean, scale) float64
+        self.input_stats = (mean, scale) if mean is not None else None
+
+    def fold_input_scaling(self, mean: np.ndarray, inv_scale: np.ndarray):
+        """
+        Fold x -> (x - mean) * inv_scale into the first layer:
+        ((x - m) * s) @ W + b == x @ (s[:, None] * W) + (b - (m * s) @ W).
+        Afterwards predict() takes raw, unscaled features.
+        """
+        W = self.weights["0_kernel"].astype(np.float64)
+        b = self.weights["0_bias"].astype(np.float64)
+        mean = np.asarray(mean, dtype=np.float64)
+        inv_scale = np.asarray(inv_scale, dtype=np.float64)
+        self.weights["0_kernel"] = (inv_scale[:, None] * W).astype(np.float32)
+        self.weights["0_bias"] = (b - (mean * inv_scale) @ W).astype(np.float32)
+
+    @property
+    def supports_projections(self) -> bool:
+        return self.layers[0]["type"] == "lstm"
+
+    def input_projection(self, X: np.ndarray) -> np.ndarray:
+        """
+        First LSTM layer's X @ W + b, (..., T, 4 * units). Each timestep's row
+        depends only on that timestep's input, so it can be reused when
+        windows overlap; the recurrence itself starts from zero state at the
+        first bar of every window and always has to be rerun.
+        """
+        return np.asarray(X, dtype=np.float32) @ self.weights["0_kernel"] + self.weights["0_bias"]
+
+    def _lstm(self, i: int, spec: dict, X: np.ndarray, Z: np.ndarray = None) -> np.ndarray:
+        U = self.weights[f"{i}_recurrent_kernel"]
+        units = spec["units"]
+        act = spec["activation"]
+        rec_act = spec["recurrent_activation"]
+
+        n, steps, _ = X.shape
+        if Z is None:
+            Z = X @ self.weights[f"{i}_kernel"] + self.weights[f"{i}_bias"]  # (N, T, 4 * units)
+        h = np.zeros((n, units), dtype=np.float32)
+        c = np.zeros((n, units), dtype=np.float32)
+        outputs = []
+        for t in range(steps):
+            z = Z[:, t] + h @ U
+            i_g = _activate(rec_act, z[:, :units])
+            f_g = _activate(rec_act, z[:, units:2 * units])
+            c_g = _activate(act, z[:, 2 * units:3 * units])
+            o_g = _activate(rec_act, z[:, 3 * units:])
+            c = f_g * c + i_g * c_g
+            h = o_g * _activate(act, c)
+            if spec["return_sequences"]:
+                outputs.append(h)
+
+        return np.stack(outputs, axis=1) if spec["return_sequences"] else h
+
+    def predict(self, X: np.ndarray, projections: np.ndarray = None) -> np.ndarray:
+        """
+        X shape: (N, time_steps, n_features); returns (N, n_classes) float32.
+        `projections` is input_projection(X) when the caller already has it.
+        """
+        out = np.asarray(X, dtype=np.float32)
+        for i, spec in enumerate(self.layers):
+            if spec["type"] == "lstm":
+                out = self._lstm(i, spec, out, projections if i == 0 else None)
+            else:
+                out = _activate(spec["activation"], out @ self.weights[f"{i}_kernel"] + self.weights[f"{i}_bias"])
+        return out
+
+
+def main():
+    from core.predictor import MODEL_PATH, SCALER_PATH, WEIGHTS_PATH
+
+    parser = argparse.ArgumentParser(description="Export the Keras regime model for the NumPy backend")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export")
+    export.add_argument("--model", default=str(MODEL_PATH))
+    export.add_argument("--scaler", default=str(SCALER_PATH))
+    export.add_argument("--out", default=str(WEIGHTS_PATH))
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_weights(Path(args.model), Path(args.out), Path(args.scaler))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,101 @@
 # core/predictor.py
 import json
+import os
+import threading
+import time
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from pathlib import Path
-import joblib
-from tensorflow.keras.models import load_model
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
+from core.metrics import registry, timed
 
 MODELS_DIR = Path("models")
 
 MODEL_PATH = MODELS_DIR / "lstm_regime_model.keras"
 SCALER_PATH = MODELS_DIR / "scaler.joblib"
 META_PATH = MODELS_DIR / "lstm_model_metadata.json"
+# exported by `python -m core.numpy_lstm export`
+WEIGHTS_PATH = MODELS_DIR / "lstm_regime_weights.npz"
+
+PREDICTOR_METRIC = "regime_predictor_seconds"
+registry.histogram(PREDICTOR_METRIC, "Predictor time per stage in seconds")
+
+# "keras", "numpy", or "auto" (numpy when the exported weights exist)
+DEFAULT_BACKEND = os.getenv("REGIME_BACKEND", "auto")
+
+# windows per model call in predict_series
+SERIES_BATCH_SIZE = 1024
+
+def _load_keras_model(path):
+    # tensorflow is only imported when the keras backend is used
+    from tensorflow.keras.models import load_model
+    return load_model(path)
+
+class _CacheEntry(NamedTuple):
+    window: np.ndarray      # raw features, (T, F)
+    inputs: np.ndarray      # model inputs, (T, F) float32
+    projection: Optional[np.ndarray]  # first-layer input projection, (T, 4 * units)
+    result: dict
+
+def _shared_rows(old: np.ndarray, new: np.ndarray) -> Tuple[int, int]:
+    """
+    (k, m) such that new[:m] == old[k:k + m]: k is where new's first row sits
+    in the previous window (the number of bars it moved by), m how many rows
+    match from there. (0, 0) when nothing carries over.
+    """
+    starts = np.flatnonzero((old == new[0]).all(axis=1))
+    if len(starts) == 0:
+        return 0, 0
+    k = int(starts[0])
+    same = (old[k:] == new[:len(old) - k]).all(axis=1)
+    m = len(same) if same.all() else int(np.argmin(same))
+    return k, m
+
+def _load_scaler_stats(path):
+    # sklearn is only needed to unpickle the scaler
+    import joblib
+    scaler = joblib.load(path)
+    n = scaler.n_features_in_
+    mean = scaler.mean_ if scaler.with_mean else np.zeros(n)
+    scale = scaler.scale_ if scaler.with_std else np.ones(n)
+    return mean, scale
+
+def load_metadata() -> dict:
+    """time_steps, features and regime_map, without loading the model."""
+    with open(META_PATH, "r") as f:
+        return json.load(f)
 
 class RegimePredictor:
-    def __init__(self):
-        # Load model + scaler
-        self.model = load_model(MODEL_PATH)
-        self.scaler = joblib.load(SCALER_PATH)
+    def __init__(self, backend: str = None):
+        backend = (backend or DEFAULT_BACKEND).lower()
+        if backend == "auto":
+            backend = "numpy" if WEIGHTS_PATH.exists() else "keras"
+        if backend not in ("keras", "numpy"):
+            raise ValueError(f"Unknown predictor backend '{backend}'")
+        self.backend = backend
+
+        # Load model + scaler stats
+        stats = None
+        if backend == "numpy":
+            from core.numpy_lstm import NumpyLSTMModel
+            self.model = NumpyLSTMModel(WEIGHTS_PATH)
+            stats = self.model.input_stats
+        else:
+            self.model = _load_keras_model(MODEL_PATH)
+        if stats is None:
+            stats = _load_scaler_stats(SCALER_PATH)
+        mean, scale = stats
+
+        # StandardScaler.transform as float32 (x - mean) * inv_scale; the
+        # numpy backend folds it into the first layer's weights instead
+        self.input_mean = np.asarray(mean, dtype=np.float32)
+        self.input_inv_scale = np.asarray(1.0 / np.asarray(scale, dtype=np.float64), dtype=np.float32)
+        self.inputs_folded = backend == "numpy"
+        if self.inputs_folded:
+            self.model.fold_input_scaling(mean, 1.0 / np.asarray(scale, dtype=np.float64))
 
         # Load metadata
-        with open(META_PATH, "r") as f:
-            self.meta = json.load(f)
+        self.meta = load_metadata()
 
         self.time_steps = self.meta["time_steps"]
         self.features = self.meta["features"]
@@ -32,8 +108,11 @@ class RegimePredictor:
 
         self.n_features = len(self.features)
 
+        # last window per key, see predict_batch
+        self._cache: Dict[str, _CacheEntry] = {}
+
         print(
-            f"[Predictor] Loaded LSTM | "
+            f"[Predictor] Loaded LSTM ({self.backend}) | "
             f"time_steps={self.time_steps}, "
             f"features={self.n_features}, "
             f"regimes={len(self.index_to_regime)}"
@@ -49,14 +128,137 @@ class RegimePredictor:
                 f"got {feature_sequence.shape}"
             )
 
-        # Scale per timestep
-        scaled = self.scaler.transform(feature_sequence)
+        return self.predict_batch(feature_sequence[np.newaxis, :, :])[0]
+
+    def predict_batch(self, sequences: np.ndarray, keys: Optional[Sequence[str]] = None):
+        """
+        sequences shape: (n_symbols, time_steps, n_features)
+        Runs a single model call for the whole batch and returns one
+        result dict per row, in order.
+
+        With `keys` (one per row, e.g. the symbol), the last window and
+        result are cached per key: an unchanged window returns the cached
+        result without touching the model, and on the numpy backend the
+        input projections of rows shared with the previous window (shifted
+        by however many bars have closed) are reused.
+        """
+        if sequences.ndim != 3 or sequences.shape[1:] != (self.time_steps, self.n_features):
+            raise ValueError(
+                f"Expected shape (N, {self.time_steps}, {self.n_features}), "
+                f"got {sequences.shape}"
+            )
+
+        n = sequences.shape[0]
+        if n == 0:
+            return []
+
+        if keys is None:
+            return [self._to_result(p) for p in self._run_model(self.scale_inputs(sequences))]
 
-        # Add batch dimension
-        X = scaled[np.newaxis, :, :]  # (1, 64, 14)
+        if len(keys) != n:
+            raise ValueError(f"Expected {n} keys, got {len(keys)}")
 
-        probs = self.model.predict(X, verbose=0)[0]
+        results = [None] * n
+        todo = []
+        for i, key in enumerate(keys):
+            entry = self._cache.get(key)
+            if entry is not None and np.array_equal(entry.window, sequences[i]):
+                results[i] = entry.result
+            else:
+                todo.append(i)
+        if not todo:
+            return results
 
+        X = self.scale_inputs(sequences[todo])
+        Z = None
+        if self.backend == "numpy" and self.model.supports_projections:
+            with timed(PREDICTOR_METRIC, stage="projection", backend=self.backend):
+                Z = np.stack([
+                    self._projection(self._cache.get(keys[i]), X[j])
+                    for j, i in enumerate(todo)
+                ])
+        probs = self._run_model(X, Z)
+
+        for j, i in enumerate(todo):
+            results[i] = self._to_result(probs[j])
+            self._cache[keys[i]] = _CacheEntry(
+                window=np.array(sequences[i], copy=True),
+                inputs=X[j],
+                projection=None if Z is None else Z[j],
+                result=results[i],
+            )
+        return results
+
+    def clear_cache(self):
+        self._cache.clear()
+
+    def predict_series(self, rows: np.ndarray, batch_size: int = SERIES_BATCH_SIZE) -> np.ndarray:
+        """
+        rows shape: (n_bars, n_features), consecutive bars.
+        Scores the window ending at every bar from the time_steps-th on and
+        returns (n_bars - time_steps + 1, n_regimes) float32 probabilities.
+
+        Windows are strided views over `rows`, never materialized as a
+        whole; on the numpy backend the first-layer input projection is
+        computed once per bar and windowed the same way.
+        """
+        rows = np.asarray(rows, dtype=np.float32)
+        if rows.ndim != 2 or rows.shape[1] != self.n_features:
+            raise ValueError(f"Expected shape (n_bars, {self.n_features}), got {rows.shape}")
+
+        n_windows = len(rows) - self.time_steps + 1
+        out = np.empty((max(n_windows, 0), len(self.index_to_regime)), dtype=np.float32)
+        if n_windows <= 0:
+            return out
+
+        def windows(a):
+            # (n_bars, C) -> (n_windows, time_steps, C) view
+            return sliding_window_view(a, self.time_steps, axis=0).transpose(0, 2, 1)
+
+        inputs = self.scale_inputs(rows)
+        X = windows(inputs)
+        Z = None
+        if self.backend == "numpy" and self.model.supports_projections:
+            with timed(PREDICTOR_METRIC, stage="projection", backend=self.backend):
+                Z = windows(self.model.input_projection(inputs))
+
+        for start in range(0, n_windows, batch_size):
+            stop = min(start + batch_size, n_windows)
+            if Z is not None:
+                out[start:stop] = self._run_model(X[start:stop], Z[start:stop])
+            else:
+                out[start:stop] = self._run_model(np.ascontiguousarray(X[start:stop]))
+        return out
+
+    def _run_model(self, X: np.ndarray, projections: Optional[np.ndarray] = None) -> np.ndarray:
+        with timed(PREDICTOR_METRIC, stage="model", backend=self.backend):
+            if self.backend == "numpy":
+                return self.model.predict(X, projections=projections)
+            return self.model.predict(X, batch_size=len(X), verbose=0)
+
+    def _projection(self, entry: Optional["_CacheEntry"], x: np.ndarray) -> np.ndarray:
+        # reuse the rows the previous window shares with this one
+        if entry is None or entry.projection is None:
+            return self.model.input_projection(x)
+        k, m = _shared_rows(entry.inputs, x)
+        if m == 0:
+            return self.model.input_projection(x)
+        z = np.empty_like(entry.projection)
+        z[:m] = entry.projection[k:k + m]
+        if m < len(x):
+            z[m:] = self.model.input_projection(x[m:])
+        return z
+
+    def scale_inputs(self, sequences: np.ndarray) -> np.ndarray:
+        """StandardScaler.transform over (N, T, F), in float32 and one output buffer."""
+        if self.inputs_folded:
+            return np.asarray(sequences, dtype=np.float32)
+        with timed(PREDICTOR_METRIC, stage="scale", backend=self.backend):
+            X = np.subtract(sequences, self.input_mean, dtype=np.float32)
+            X *= self.input_inv_scale
+        return X
+
+    def _to_result(self, probs: np.ndarray):
         prob_map = {
             self.index_to_regime[i]: float(probs[i])
             for i in range(len(probs))
@@ -73,5 +275,31 @@ class RegimePredictor:
         }
 
 
-# Singleton instance (model loads ONCE)
-predictor = RegimePredictor()
+# -------------------------
+# Lazy singleton
+# -------------------------
+_predictor = None
+_predictor_lock = threading.Lock()
+
+def get_predictor() -> RegimePredictor:
+    """The shared predictor; the model loads once, on first use."""
+    global _predictor
+    if _predictor is None:
+        with _predictor_lock:
+            if _predictor is None:
+                _predictor = RegimePredictor()
+    return _predictor
+
+def warm_up() -> RegimePredictor:
+    """Load the model now and run one dummy batch so the first real cycle is fast."""
+    start = time.perf_counter()
+    p = get_predictor()
+    p.predict_batch(np.zeros((1, p.time_steps, p.n_features), dtype=np.float32))
+    print(f"[Predictor] Warm-up done in {time.perf_counter() - start:.2f}s")
+    return p
+
+def __getattr__(name):
+    # keeps `from core.predictor import predictor` working without loading at import
+    if name == "predictor":
+        return get_predictor()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,102 @@
+# core/startup_report.py
+"""
+Where startup time goes: cold import time of each service module (fresh
+interpreter each), the slowest imports underneath them, and the model
+load / warm-up cost.
+
+    python -m core.startup_report [--top 15]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+MODULES = [
+    "core.state",
+    "core.compute_features",
+    "core.incremental_features",
+    "core.data_fetcher",
+    "core.predictor",
+    "api.app",
+    "worker.regime_worker",
+]
+
+
+def _run(code: str, *flags: str) -> subprocess.CompletedProcess:
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([os.getcwd(), os.environ.get("PYTHONPATH", "")])}
+    return subprocess.run(
+        [sys.executable, "-W", "ignore", *flags, "-c", code],
+        capture_output=True, text=True, env=env,
+    )
+
+
+def import_seconds(module: str) -> float:
+    code = (
+        "import time; t = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - t)"
+    )
+    proc = _run(code)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    return float(proc.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(module: str, top: int):
+    """
+    Top-level packages by cumulative import time, from -X importtime.
+    A package is counted where something outside it first imports it, so
+    nested numbers overlap (core includes the pandas it pulls in).
+    """
+    proc = _run(f"import {module}", "-X", "importtime")
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header
+        level = (len(name) - len(name.lstrip())) // 2
+        entries.append((level, int(cumulative), name.strip()))
+
+    # children are printed before their parent, so walk backwards
+    totals = {}
+    parents = {}
+    for level, cumulative, name in reversed(entries):
+        parents[level] = name
+        root = name.split(".")[0]
+        parent = parents.get(level - 1) if level > 0 else None
+        if parent is None or parent.split(".")[0] != root:
+            totals[root] = totals.get(root, 0) + cumulative
+    return sorted(totals.items(), key=lambda kv: kv[1], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report service startup timings")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--module", default="worker.regime_worker", help="module to break down with -X importtime")
+    args = parser.parse_args()
+
+    print("Cold import (fresh interpreter)")
+    for module in MODULES:
+        try:
+            print(f"  {module:<30} {import_seconds(module):7.3f}s")
+        except RuntimeError as e:
+            print(f"  {module:<30} failed: {e}")
+
+    print(f"\nSlowest imports under {args.module} (cumulative)")
+    for name, us in slowest_imports(args.module, args.top):
+        print(f"  {name:<30} {us / 1e6:7.3f}s")
+
+    from core.predictor import get_predictor, warm_up
+    start = time.perf_counter()
+    p = get_predictor()
+    loaded = time.perf_counter() - start
+    start = time.perf_counter()
+    warm_up()
+    print(f"\nModel load ({p.backend})            {loaded:7.3f}s")
+    print(f"First batch                     {time.perf_counter() - start:7.3f}s")
+
+
+if __name__ == "__main__":
+    main()
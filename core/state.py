@@ -1,26 +1,171 @@
 import json
+import os
+import threading
 import time
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 STATE_FILE = Path("latest_state.json")
+DEFAULT_SYMBOL = "BTCUSDT"
+
+# how often the API re-stats the state file for changes (seconds)
+STATE_CHECK_INTERVAL = 0.25
+
+def _empty_state(symbol: str) -> Dict[str, Any]:
+    return {
+        "timestamp": None,
+        "symbol": symbol,
+        "current_regime": None,
+        "confidence": None,
+        "probabilities": None,
+    }
+
+def _parse_states(data: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    # legacy single-symbol layout
+    if "symbol" in data and "current_regime" in data:
+        return {data["symbol"]: data}
+    return data
+
+def _read_states() -> Dict[str, Dict[str, Any]]:
+    if not STATE_FILE.exists():
+        return {}
+    with STATE_FILE.open("r") as f:
+        return _parse_states(json.load(f))
+
+def _write_states(states: Dict[str, Dict[str, Any]]):
+    # write to a temp file and rename over the old one so readers never
+    # see a partially written file
+    tmp = STATE_FILE.with_name(f".{STATE_FILE.name}.{os.getpid()}.tmp")
+    with tmp.open("w") as f:
+        json.dump(states, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, STATE_FILE)
+    state_cache.invalidate()
+
+def update_states(states: Dict[str, Dict[str, Any]]):
+    """Update several symbols with a single write; other symbols are kept."""
+    now = int(time.time())
+    payload = _read_states()
+    for symbol, state in states.items():
+        payload[symbol] = {**state, "symbol": symbol, "timestamp": now}
+    _write_states(payload)
 
 def update_state(state: Dict[str, Any]):
-    payload = {
+    states = _read_states()
+    symbol = state.get("symbol", DEFAULT_SYMBOL)
+    states[symbol] = {
         **state,
         "timestamp": int(time.time())
     }
-    with STATE_FILE.open("w") as f:
-        json.dump(payload, f)
+    _write_states(states)
 
-def get_state() -> Dict[str, Any]:
-    if not STATE_FILE.exists():
-        return {
-            "timestamp": None,
-            "symbol": "BTCUSDT",
-            "current_regime": None,
-            "confidence": None,
-            "probabilities": None,
-        }
-    with STATE_FILE.open("r") as f:
-        return json.load(f)
+def get_state(symbol: str = DEFAULT_SYMBOL) -> Dict[str, Any]:
+    states = _read_states()
+    if symbol not in states:
+        return _empty_state(symbol)
+    return states[symbol]
+
+def get_all_states() -> Dict[str, Dict[str, Any]]:
+    return _read_states()
+
+
+# -------------------------
+# Cached view for the API
+# -------------------------
+def _dumps(obj: Any) -> bytes:
+    # same encoding FastAPI's JSONResponse uses
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+class StateCache:
+    """
+    In-memory copy of the state file for read-heavy callers.
+
+    The file is re-parsed only when its (mtime, size, inode) changes, and
+    at most once per `check_interval` seconds it is stat'ed to find out.
+    Writes from this process invalidate the cache immediately. Response
+    bodies for the symbols in the file are serialized once per change and
+    served as bytes; unknown symbols are serialized on every request.
+    """
+
+    def __init__(self, check_interval: float = STATE_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._signature = None
+        self._checked_at = 0.0
+        self._states: Dict[str, Dict[str, Any]] = {}
+        self._bodies: Dict[Any, bytes] = {}
+        self.version = 0
+
+    def invalidate(self):
+        self._checked_at = 0.0
+
+    def _signature_now(self) -> Optional[tuple]:
+        try:
+            st = os.stat(STATE_FILE)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return
+            signature = self._signature_now()
+            if signature != self._signature:
+                try:
+                    states = _read_states() if signature is not None else {}
+                except (OSError, ValueError) as e:
+                    # keep serving the previous copy; retry on next check
+                    print("[StateCache] Failed to reload state:", e)
+                    self._checked_at = now
+                    return
+                self._states = states
+                self._bodies = {}
+                self._signature = signature
+                self.version += 1
+            self._checked_at = now
+
+    def states(self) -> Dict[str, Dict[str, Any]]:
+        self.refresh()
+        return self._states
+
+    def state(self, symbol: str = DEFAULT_SYMBOL) -> Dict[str, Any]:
+        return self.states().get(symbol) or _empty_state(symbol)
+
+    def _body(self, key, build, symbol: Optional[str] = None) -> bytes:
+        bodies = self._bodies
+        body = bodies.get(key)
+        if body is None:
+            body = _dumps(build())
+            # only symbols in the file are cached: `symbol` comes from the
+            # query string, so unknown ones would grow the cache unbounded
+            if symbol is None or symbol in self._states:
+                bodies[key] = body
+        return body
+
+    def state_body(self, symbol: str = DEFAULT_SYMBOL) -> bytes:
+        self.refresh()
+        return self._body(("state", symbol), lambda: self.state(symbol), symbol)
+
+    def alerts_body(self, symbol: str = DEFAULT_SYMBOL) -> bytes:
+        self.refresh()
+
+        def build():
+            state = self.state(symbol)
+            return {
+                "timestamp": state.get("timestamp"),
+                "alerts": state.get("alerts", [])
+            }
+
+        return self._body(("alerts", symbol), build, symbol)
+
+    def all_states_body(self) -> bytes:
+        self.refresh()
+        return self._body("all", lambda: self._states)
+
+
+state_cache = StateCache()
@@ -1,9 +1,10 @@
 #
 import os
-import json
+import sys
 import requests
 import asyncio
-from typing import Dict
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from telegram import (
     Update,
@@ -17,6 +18,8 @@ from telegram.ext import (
     ContextTypes,
 )
 
+from tg.subscriptions import ALERT, REGIME, get_store
+
 # -------------------------
 # CONFIG
 # -------------------------
@@ -24,8 +27,6 @@ from telegram.ext import (
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 API_URL = os.getenv("REGIME_API_URL", "http://127.0.0.1:8000/current-regime")
 
-BASE_DIR = os.path.dirname(__file__)
-SETTINGS_FILE = os.path.join(BASE_DIR, "user_settings.json")
 
 REGIMES = [
     "Choppy High-Vol",
@@ -42,51 +43,16 @@ ALERT_TYPES = [
     "REGIME_CHANGE",
 ]
 
-# -------------------------
-# STORAGE
-# -------------------------
-
-def load_settings() -> Dict:
-    if not os.path.exists(SETTINGS_FILE):
-        return {}
-    with open(SETTINGS_FILE, "r") as f:
-        return json.load(f)
-
-def save_settings(data: Dict):
-    with open(SETTINGS_FILE, "w") as f:
-        json.dump(data, f, indent=2)
-        
-def normalize_user_settings(user: Dict):
-    # Ensure all alerts exist
-    for a in ALERT_TYPES:
-        user["alerts"].setdefault(a, False)
-
-    # Ensure all regimes exist
-    for r in REGIMES:
-        user["regime_notify"].setdefault(r, False)
-
-
-def ensure_user(settings: Dict, chat_id: int) -> Dict:
-    cid = str(chat_id)
-    if cid not in settings:
-        settings[cid] = {
-            "alerts": {a: False for a in ALERT_TYPES},
-            "regime_notify": {r: False for r in REGIMES},
-        }
-    else:
-        normalize_user_settings(settings[cid])
-    return settings[cid]
-
 # -------------------------
 # KEYBOARDS
 # -------------------------
 
-def build_alert_keyboard(settings: Dict, chat_id: int) -> InlineKeyboardMarkup:
-    user = ensure_user(settings, chat_id)
+def build_alert_keyboard(chat_id: int) -> InlineKeyboardMarkup:
+    enabled = get_store().enabled(chat_id)[ALERT]
     keyboard = []
 
     for a in ALERT_TYPES:
-        status = "ON" if user["alerts"][a] else "OFF"
+        status = "ON" if a in enabled else "OFF"
         keyboard.append([
             InlineKeyboardButton(
                 text=f"{a.replace('_', ' ').title()}: {status}",
@@ -96,12 +62,12 @@ def build_alert_keyboard(settings: Dict, chat_id: int) -> InlineKeyboardMarkup:
 
     return InlineKeyboardMarkup(keyboard)
 
-def build_regime_keyboard(settings: Dict, chat_id: int) -> InlineKeyboardMarkup:
-    user = ensure_user(settings, chat_id)
+def build_regime_keyboard(chat_id: int) -> InlineKeyboardMarkup:
+    enabled = get_store().enabled(chat_id)[REGIME]
     keyboard = []
 
     for r in REGIMES:
-        status = "ON" if user["regime_notify"][r] else "OFF"
+        status = "ON" if r in enabled else "OFF"
         keyboard.append([
             InlineKeyboardButton(
                 text=f"{r}: {status}",
@@ -124,21 +90,19 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 async def alerts(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    settings = load_settings()
     chat_id = update.effective_chat.id
 
     await update.message.reply_text(
         "Toggle alert notifications:",
-        reply_markup=build_alert_keyboard(settings, chat_id),
+        reply_markup=build_alert_keyboard(chat_id),
     )
 
 async def regimes(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    settings = load_settings()
     chat_id = update.effective_chat.id
 
     await update.message.reply_text(
         "Notify me when market enters:",
-        reply_markup=build_regime_keyboard(settings, chat_id),
+        reply_markup=build_regime_keyboard(chat_id),
     )
 
 async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -168,35 +132,31 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = query.message.chat.id
     data = query.data
 
-    settings = load_settings()
-    user = ensure_user(settings, chat_id)
-
     if data.startswith("TOGGLE_ALERT_"):
         alert = data.replace("TOGGLE_ALERT_", "")
-        if alert not in user["alerts"]:
+        if alert not in ALERT_TYPES:
             await query.answer("Unknown alert", show_alert=True)
             return
 
-        user["alerts"][alert] = not user["alerts"][alert]
-        save_settings(settings)
+        # single transaction; the worker reads the same store concurrently
+        get_store().toggle(chat_id, ALERT, alert)
 
         await query.edit_message_reply_markup(
-            reply_markup=build_alert_keyboard(settings, chat_id)
+            reply_markup=build_alert_keyboard(chat_id)
         )
         await query.answer()
         return
 
     if data.startswith("TOGGLE_REGIME_"):
         regime = data.replace("TOGGLE_REGIME_", "")
-        if regime not in user["regime_notify"]:
+        if regime not in REGIMES:
             await query.answer("Unknown regime", show_alert=True)
             return
 
-        user["regime_notify"][regime] = not user["regime_notify"][regime]
-        save_settings(settings)
+        get_store().toggle(chat_id, REGIME, regime)
 
         await query.edit_message_reply_markup(
-            reply_markup=build_regime_keyboard(settings, chat_id)
+            reply_markup=build_regime_keyboard(chat_id)
         )
         await query.answer()
         return
@@ -0,0 +1,235 @@
+# tg/dispatcher.py
+"""
+Non-blocking Telegram delivery for the worker.
+
+`enqueue` only records the message; a background task on the running
+event loop sends it over one pooled HTTP client. Sends are paced to
+Telegram's limits (about 30 messages/s overall and 1 message/s per chat),
+429 responses are retried after their `retry_after`, and messages that pile
+up for the same chat while it waits its turn go out as one message.
+
+    async with TelegramDispatcher(BOT_TOKEN) as dispatcher:
+        dispatcher.enqueue(chat_id, "text")
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+BOT_TOKEN = os.getenv("BOT_TOKEN")
+TELEGRAM_BASE = "https://api.telegram.org"
+
+GLOBAL_MESSAGES_PER_SECOND = 30
+CHAT_MESSAGES_PER_SECOND = 1
+# Telegram rejects longer texts
+MAX_MESSAGE_LENGTH = 4096
+MESSAGE_SEPARATOR = "\n\n"
+
+
+def pack_messages(texts: List[str], limit: int = MAX_MESSAGE_LENGTH):
+    """Join as many leading texts as fit in one message; returns (text, rest)."""
+    out = texts[0][:limit]
+    n = 1
+    for text in texts[1:]:
+        if len(out) + len(MESSAGE_SEPARATOR) + len(text) > limit:
+            break
+        out += MESSAGE_SEPARATOR + text
+        n += 1
+    return out, texts[n:]
+
+
+class TelegramDispatcher:
+    def __init__(
+        self,
+        token: Optional[str] = BOT_TOKEN,
+        base_url: str = TELEGRAM_BASE,
+        global_rate: float = GLOBAL_MESSAGES_PER_SECOND,
+        chat_rate: float = CHAT_MESSAGES_PER_SECOND,
+        max_concurrency: int = 10,
+        max_retries: int = 3,
+        timeout: float = 10.0,
+    ):
+        self.token = token
+        self.global_interval = 1.0 / global_rate
+        self.chat_interval = 1.0 / chat_rate
+        self.max_retries = max_retries
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        # chat_id -> texts not yet sent; each waiting chat has a heap entry
+        # at its _chat_next time (entries earlier than that are stale)
+        self._pending: Dict[int, List[str]] = {}
+        self._attempts: Dict[int, int] = {}
+        self._heap: list = []  # (ready_at, seq, chat_id)
+        self._seq = itertools.count()
+        # chat_id -> earliest next send; absent once that time has passed
+        self._chat_next: Dict[int, float] = {}
+        self._global_next = 0.0
+        self._wakeup = asyncio.Event()
+        self._inflight = set()
+        self._task: Optional[asyncio.Task] = None
+
+        self.sent = 0
+        self.failed = 0
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def aclose(self, drain_timeout: float = 30.0):
+        """Deliver what is queued (up to `drain_timeout` seconds), then stop."""
+        try:
+            await asyncio.wait_for(self.drain(), drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"[TelegramDispatcher] Dropping {self.pending_count()} undelivered messages")
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._client.aclose()
+
+    async def drain(self):
+        while self._pending or self._inflight:
+            if self._inflight:
+                await asyncio.wait(list(self._inflight))
+            else:
+                await asyncio.sleep(0.05)
+
+    def pending_count(self) -> int:
+        return sum(len(texts) for texts in self._pending.values())
+
+    # -------------------------
+    # Queue
+    # -------------------------
+    def enqueue(self, chat_id: int, text: str):
+        """Queue `text` for `chat_id` and return immediately."""
+        if not self.token:
+            return
+        texts = self._pending.get(chat_id)
+        if texts is not None:
+            # chat already waiting for its turn: goes out in the same message
+            texts.append(text)
+            return
+        self._pending[chat_id] = [text]
+        self._schedule(chat_id, self._chat_next.get(chat_id, 0.0))
+
+    def _schedule(self, chat_id: int, ready_at: float):
+        heapq.heappush(self._heap, (ready_at, next(self._seq), chat_id))
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            if not self._heap:
+                self._prune(time.monotonic())
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            ready_at = max(self._heap[0][0], self._global_next)
+            if ready_at > now:
+                # a newly queued chat may be ready sooner
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), ready_at - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            entry_at, _, chat_id = heapq.heappop(self._heap)
+            if entry_at < self._chat_next.get(chat_id, 0.0):
+                # superseded by a later entry (a failed send was rescheduled)
+                continue
+            texts = self._pending.pop(chat_id, None)
+            if not texts:
+                continue
+            text, rest = pack_messages(texts)
+            if rest:
+                self._pending[chat_id] = rest
+
+            self._global_next = now + self.global_interval
+            self._chat_next[chat_id] = now + self.chat_interval
+            if rest:
+                self._schedule(chat_id, self._chat_next[chat_id])
+
+            attempt = self._attempts.pop(chat_id, 0)
+            task = asyncio.get_running_loop().create_task(self._send(chat_id, text, attempt))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    def _prune(self, now: float):
+        # forget chats that are idle and free to send again
+        self._chat_next = {
+            chat_id: t for chat_id, t in self._chat_next.items()
+            if t > now or chat_id in self._pending
+        }
+        self._attempts = {
+            chat_id: n for chat_id, n in self._attempts.items() if chat_id in self._pending
+        }
+
+    # -------------------------
+    # Delivery
+    # -------------------------
+    def _requeue(self, chat_id: int, text: str, delay: float):
+        # put the failed text back in front of anything queued since; an
+        # entry already in the heap for this chat is now stale and skipped
+        now = time.monotonic()
+        self._pending[chat_id] = [text] + self._pending.get(chat_id, [])
+        self._chat_next[chat_id] = max(self._chat_next.get(chat_id, 0.0), now + delay)
+        self._schedule(chat_id, self._chat_next[chat_id])
+
+    async def _send(self, chat_id: int, text: str, attempt: int = 0):
+        payload = {"chat_id": chat_id, "text": text}
+        try:
+            async with self._semaphore:
+                r = await self._client.post(f"/bot{self.token}/sendMessage", json=payload)
+        except httpx.HTTPError as e:
+            r = None
+            error = str(e)
+
+        if r is not None and r.status_code == 200:
+            self.sent += 1
+            return
+
+        if attempt >= self.max_retries:
+            self.failed += 1
+            detail = error if r is None else f"{r.status_code} {r.text[:200]}"
+            print(f"[TelegramDispatcher] Giving up on chat {chat_id}: {detail}")
+            return
+
+        if r is not None and r.status_code == 429:
+            try:
+                retry_after = float(r.json()["parameters"]["retry_after"])
+            except (ValueError, KeyError, TypeError):
+                retry_after = float(r.headers.get("retry-after", 2 ** attempt))
+            # flood limits can be account-wide: pause everything, not just this chat
+            self._global_next = max(self._global_next, time.monotonic() + retry_after)
+            print(f"[TelegramDispatcher] 429 for chat {chat_id}, retrying in {retry_after:.0f}s")
+        elif r is not None and 400 <= r.status_code < 500:
+            # blocked bot, bad chat id, ...: retrying won't help
+            self.failed += 1
+            print(f"[TelegramDispatcher] Dropping message for chat {chat_id}: {r.status_code} {r.text[:200]}")
+            return
+        else:
+            retry_after = 2 ** attempt
+
+        self._attempts[chat_id] = attempt + 1
+        self._requeue(chat_id, text, retry_after)
@@ -0,0 +1,155 @@
+# tg/subscriptions.py
+"""
+Telegram subscriptions in SQLite (WAL mode).
+
+Only enabled subscriptions are stored, one row per (chat, kind, key), with
+an index on (kind, key) so the worker's fan-out reads just the chats
+subscribed to a given alert or regime. Toggles run in their own write
+transaction, so the bot and the worker never overwrite each other.
+
+The old tg/user_settings.json is imported once, the first time the store
+is opened.
+"""
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+BASE_DIR = os.path.dirname(__file__)
+SUBSCRIPTIONS_DB = os.getenv("SUBSCRIPTIONS_DB", os.path.join(BASE_DIR, "subscriptions.db"))
+LEGACY_SETTINGS_FILE = os.path.join(BASE_DIR, "user_settings.json")
+
+# subscription kinds; keys are alert types / regime names
+ALERT = "alert"
+REGIME = "regime"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscriptions (
+    chat_id TEXT NOT NULL,
+    kind    TEXT NOT NULL,
+    key     TEXT NOT NULL,
+    PRIMARY KEY (chat_id, kind, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_subscriptions_kind_key ON subscriptions (kind, key, chat_id);
+CREATE TABLE IF NOT EXISTS meta (
+    name  TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def alert_key(alert: str) -> str:
+    # "REGIME_CHANGE Range → Squeeze" is stored under "REGIME_CHANGE"
+    return alert.split(" ", 1)[0]
+
+
+class SubscriptionStore:
+    def __init__(self, path: str = SUBSCRIPTIONS_DB, legacy_json: Optional[str] = LEGACY_SETTINGS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        # autocommit; transactions are opened explicitly
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        if legacy_json:
+            self.migrate_from_json(legacy_json)
+
+    def close(self):
+        self._conn.close()
+
+    # -------------------------
+    # Reads
+    # -------------------------
+    def subscribers(self, kind: str, key: str) -> List[str]:
+        """chat_ids subscribed to `key` (index lookup, cost ~ number of matches)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chat_id FROM subscriptions WHERE kind = ? AND key = ?", (kind, key)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def enabled(self, chat_id) -> Dict[str, set]:
+        """{kind: {key, ...}} for one chat."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT kind, key FROM subscriptions WHERE chat_id = ?", (str(chat_id),)
+            ).fetchall()
+        out = {ALERT: set(), REGIME: set()}
+        for kind, key in rows:
+            out.setdefault(kind, set()).add(key)
+        return out
+
+    # -------------------------
+    # Writes
+    # -------------------------
+    def toggle(self, chat_id, kind: str, key: str) -> bool:
+        """Flip one subscription atomically; returns the new state."""
+        chat_id = str(chat_id)
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                deleted = conn.execute(
+                    "DELETE FROM subscriptions WHERE chat_id = ? AND kind = ? AND key = ?",
+                    (chat_id, kind, key),
+                ).rowcount
+                if not deleted:
+                    conn.execute(
+                        "INSERT INTO subscriptions (chat_id, kind, key) VALUES (?, ?, ?)",
+                        (chat_id, kind, key),
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return not deleted
+
+    def migrate_from_json(self, path: str):
+        """Import the legacy settings file once; later calls are no-ops."""
+        with self._lock:
+            conn = self._conn
+            done = conn.execute("SELECT value FROM meta WHERE name = 'migrated_json'").fetchone()
+            if done or not os.path.exists(path):
+                return
+            try:
+                with open(path, "r") as f:
+                    settings = json.load(f)
+            except (OSError, ValueError) as e:
+                print("[Subscriptions] Could not read legacy settings:", e)
+                return
+
+            rows = []
+            for chat_id, prefs in settings.items():
+                rows += [(str(chat_id), ALERT, a) for a, on in prefs.get("alerts", {}).items() if on]
+                rows += [(str(chat_id), REGIME, r) for r, on in prefs.get("regime_notify", {}).items() if on]
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO subscriptions (chat_id, kind, key) VALUES (?, ?, ?)", rows
+                )
+                conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('migrated_json', ?)", (path,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        if rows:
+            print(f"[Subscriptions] Imported {len(rows)} subscriptions from {path}")
+
+
+# -------------------------
+# Shared store
+# -------------------------
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> SubscriptionStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SubscriptionStore()
+    return _store
@@ -3,111 +3,313 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+import asyncio
+import random
+import statistics
 import time
-from core.predictor import predictor
-from core.state import update_state
-from core.feature_engineering import build_lstm_input
-from core.data_fetcher import fetch_klines, merge_timeframes
-from tg.bot import load_settings
-from tg.notifier import send_message
+from collections import deque
+import numpy as np
+from core.predictor import get_predictor, warm_up
+from core.state import update_states
+from core.metrics import METRICS_ENABLED, observe, registry, timed
+from core.incremental_features import StreamingFeatureEngine
+from core.data_fetcher import INTERVAL_MS, AsyncKlineFetcher, KlineStore, merge_timeframes
+from core.column_store import get_column_store
+from tg.subscriptions import ALERT, REGIME, alert_key, get_store
+from tg.dispatcher import TelegramDispatcher
 
-SYMBOL = "BTCUSDT"
-SLEEP_SECONDS = 120
+# comma-separated list, e.g. REGIME_SYMBOLS=BTCUSDT,ETHUSDT,SOLUSDT
+SYMBOLS = [
+    s.strip().upper()
+    for s in os.getenv("REGIME_SYMBOLS", "BTCUSDT").split(",")
+    if s.strip()
+]
+KLINE_CAPACITY = 300
+MAX_CONCURRENT_REQUESTS = int(os.getenv("BINANCE_MAX_CONCURRENCY", "10"))
 
-prev_regime = None
+# ---- scheduling: run just after every 5m close (which includes every 15m close)
+BAR_INTERVAL = "5m"
+# wait this long after the close so the exchange has rolled the bar
+SCHEDULE_GRACE_SECONDS = float(os.getenv("SCHEDULE_GRACE_SECONDS", "2"))
+# plus up to this much random delay, so several workers don't hit the API at once
+SCHEDULE_JITTER_SECONDS = float(os.getenv("SCHEDULE_JITTER_SECONDS", "1"))
+# symbols whose newest closed bar hasn't shown up yet are retried this often
+CLOSE_RETRY_SECONDS = 5
+CLOSE_RETRY_LIMIT = 6
 
-def run_worker():
-    global prev_regime
-    print("Regime worker started (LIVE BINANCE)")
+STAGE_METRIC = "regime_worker_stage_seconds"
+LATENCY_METRIC = "regime_close_to_publish_seconds"
+registry.histogram(STAGE_METRIC, "Worker time per cycle stage in seconds")
+registry.histogram(LATENCY_METRIC, "Seconds from 5m bar close to published regime")
+
+# append closed bars to the columnar history (core/column_store.py)
+COLUMN_STORE_ENABLED = os.getenv("REGIME_COLUMN_STORE", "1") != "0"
+
+prev_regimes = {}
+kline_store = KlineStore(capacity=KLINE_CAPACITY)
+feature_engines = {}
+# open time (ms) of the last closed bar each symbol was published for
+last_closed_bars = {}
+# seconds from bar close to published state, last day of cycles
+close_to_publish = deque(maxlen=288 * 4)
+
+
+def get_feature_engine(symbol: str) -> StreamingFeatureEngine:
+    engine = feature_engines.get(symbol)
+    if engine is None:
+        predictor = get_predictor()
+        engine = StreamingFeatureEngine(
+            feature_names=predictor.features,
+            time_steps=predictor.time_steps,
+            main_tf="5m",
+            context_tfs=["15m"],
+        )
+        feature_engines[symbol] = engine
+    return engine
+
+
+def _open_times(df) -> np.ndarray:
+    return df["timestamp"].dt.as_unit("ms").astype(np.int64).to_numpy()
 
-    while True:
+
+def last_closed_bar(df):
+    """
+    Open time (ms) of the newest bar in `df` the exchange has closed. The
+    newest bar it returns is the open one, or the one that just closed if it
+    hasn't rolled yet, so only bars with a newer bar after them count; the
+    local clock can't tell those two cases apart.
+    """
+    ts = _open_times(df)
+    return int(ts[-2]) if len(ts) > 1 else None
+
+
+def context_rolled(df_main, df_ctx, ctx_tf: str) -> bool:
+    """Whether `df_ctx` reaches the context bar `df_main`'s newest bar falls in."""
+    if len(df_main) == 0 or len(df_ctx) == 0:
+        return False
+    ctx_ms = INTERVAL_MS[ctx_tf]
+    return _open_times(df_ctx)[-1] >= _open_times(df_main)[-1] // ctx_ms * ctx_ms
+
+
+def store_closed_bars(frames: dict):
+    """Append each fetched frame's closed bars (all but its newest) to the column store."""
+    for (symbol, tf), df in frames.items():
+        if isinstance(df, Exception) or len(df) < 2:
+            continue
         try:
-            # ---- fetch data
-            df_5m = fetch_klines(SYMBOL, "5m", limit=300)
-            df_15m = fetch_klines(SYMBOL, "15m", limit=300)
-            merged = merge_timeframes(df_5m, df_15m)
-
-            # ---- model
-            X = build_lstm_input(
-                merged_ohlcv_df=merged,
-                feature_names=predictor.features,
-                time_steps=predictor.time_steps
-            )
+            get_column_store().append_klines(symbol, tf, df.iloc[:-1])
+        except Exception as e:
+            print(f"Column store error ({symbol} {tf}):", e)
 
-            result = predictor.predict(X)
-            current_regime = result["current_regime"]
-            confidence = result["confidence"]
 
-            alerts = []
+async def store_history(frames: dict):
+    """store_closed_bars off the event loop, once the cycle has published."""
+    if not COLUMN_STORE_ENABLED:
+        return
+    with timed(STAGE_METRIC, stage="store"):
+        await asyncio.to_thread(store_closed_bars, frames)
 
-            if (
-                current_regime == "Strong Trend"
-                and confidence >= 0.65
-                and prev_regime != "Strong Trend"
-            ):
-                alerts.append("STRONG_TREND_CONFIRMED")
 
-            if (
-                current_regime == "Choppy High-Vol"
-                and confidence >= 0.6
-                and prev_regime != "Choppy High-Vol"
-            ):
-                alerts.append("CHOPPY_MARKET_WARNING")
+def seconds_until_next_run(now: float = None) -> float:
+    """Time to sleep until just after the next bar close, whatever the cycle took."""
+    if now is None:
+        now = time.time()
+    interval = INTERVAL_MS[BAR_INTERVAL] / 1000
+    boundary = (now // interval + 1) * interval
+    delay = SCHEDULE_GRACE_SECONDS + random.uniform(0, SCHEDULE_JITTER_SECONDS)
+    return max(0.0, boundary + delay - now)
+
+
+def build_alerts(current_regime: str, confidence: float, prev_regime):
+    alerts = []
+
+    if (
+        current_regime == "Strong Trend"
+        and confidence >= 0.65
+        and prev_regime != "Strong Trend"
+    ):
+        alerts.append("STRONG_TREND_CONFIRMED")
+
+    if (
+        current_regime == "Choppy High-Vol"
+        and confidence >= 0.6
+        and prev_regime != "Choppy High-Vol"
+    ):
+        alerts.append("CHOPPY_MARKET_WARNING")
+
+    if (
+        prev_regime is not None
+        and current_regime != prev_regime
+        and confidence >= 0.55
+    ):
+        alerts.append(f"REGIME_CHANGE {prev_regime} → {current_regime}")
+
+    return alerts
+
+
+def notify(send, store, symbol: str, current_regime: str, confidence: float, prev_regime, alerts: list):
+    # alert-based notifications
+    for alert in alerts:
+        msg = (
+            f"⚠️ {alert.replace('_', ' ')}\n"
+            f"Symbol: {symbol}\n"
+            f"Regime: {current_regime}\n"
+            f"Confidence: {confidence:.2f}"
+        )
+        for chat_id in store.subscribers(ALERT, alert_key(alert)):
+            send(chat_id, msg)
+
+    # regime-entry notifications
+    if current_regime != prev_regime:
+        msg = (
+            f"📊 {symbol} entered {current_regime}\n"
+            f"Confidence: {confidence:.2f}"
+        )
+        for chat_id in store.subscribers(REGIME, current_regime):
+            send(chat_id, msg)
 
+
+async def run_cycle(fetcher: AsyncKlineFetcher, dispatcher: TelegramDispatcher, symbols_to_run=None):
+    """
+    One fetch/score/publish pass; notifications are queued on `dispatcher`.
+    Symbols whose last closed bar hasn't changed since they were last
+    published are skipped; they are returned so the caller can retry them
+    once the exchange rolls the bar.
+    """
+    if symbols_to_run is None:
+        symbols_to_run = SYMBOLS
+
+    # ---- fetch data: every (symbol, interval) concurrently
+    with timed(STAGE_METRIC, stage="fetch"):
+        frames = await fetcher.update_store(
+            kline_store,
+            [(symbol, tf) for symbol in symbols_to_run for tf in ("5m", "15m")]
+        )
+    # ---- features, per symbol
+    symbols = []
+    windows = []
+    closed_bars = {}
+    stale = []
+    for symbol in symbols_to_run:
+        try:
+            df_5m = frames[(symbol, "5m")]
+            df_15m = frames[(symbol, "15m")]
+            for df in (df_5m, df_15m):
+                if isinstance(df, Exception):
+                    raise df
+
+            # until the exchange rolls the bar, the newest closed one is the
+            # one already published (or the 15m frame lags the 5m one)
+            closed = last_closed_bar(df_5m)
             if (
-                prev_regime is not None
-                and current_regime != prev_regime
-                and confidence >= 0.55
-            ):
-                alerts.append(f"REGIME_CHANGE {prev_regime} → {current_regime}")
-
-            # ---- update state
-            update_state({
-                "symbol": SYMBOL,
-                **result,
-                "alerts": alerts
-            })
-
-            print("Updated state:", result)
-
-            # ---- TELEGRAM NOTIFICATIONS (IMPORTANT PART)
-
-            settings = load_settings()
-            # print("[DEBUG] Loaded settings:", settings)
-
-            for chat_id, prefs in settings.items():
-                # print(f"[DEBUG] Checking chat_id={chat_id}")
-
-                # alert-based notifications
-                for alert in alerts:
-                    if prefs["alerts"].get(alert):
-                        msg = (
-                            f"⚠️ {alert.replace('_', ' ')}\n"
-                            f"Regime: {current_regime}\n"
-                            f"Confidence: {confidence:.2f}"
-                        )
-                        # print(f"[DEBUG] Sending ALERT to {chat_id}: {msg}")
-                        send_message(chat_id, msg)
-
-                # regime-entry notifications
-                if (
-                    current_regime != prev_regime
-                    and prefs["regime_notify"].get(current_regime)
-                ):
-                    msg = (
-                        f"📊 Market entered {current_regime}\n"
-                        f"Confidence: {confidence:.2f}"
-                    )
-                    # print(f"[DEBUG] Sending REGIME to {chat_id}: {msg}")
-                    send_message(chat_id, msg)
-
-
-            prev_regime = current_regime
+                closed is not None and closed == last_closed_bars.get(symbol)
+            ) or not context_rolled(df_5m, df_15m, "15m"):
+                stale.append(symbol)
+                continue
 
+            with timed(STAGE_METRIC, stage="merge"):
+                merged = merge_timeframes(df_5m, df_15m)
+
+            # indicator state only advances over newly closed bars
+            with timed(STAGE_METRIC, stage="features"):
+                windows.append(get_feature_engine(symbol).update(merged))
+            symbols.append(symbol)
+            closed_bars[symbol] = closed
         except Exception as e:
-            print("Worker error:", e)
+            print(f"Worker error ({symbol}):", e)
+
+    if not symbols:
+        await store_history(frames)
+        return stale
+
+    # ---- model: one batched call for every symbol whose window changed
+    with timed(STAGE_METRIC, stage="predict"):
+        results = get_predictor().predict_batch(np.stack(windows), keys=symbols)
+
+    states = {}
+    for symbol, result in zip(symbols, results):
+        alerts = build_alerts(
+            result["current_regime"],
+            result["confidence"],
+            prev_regimes.get(symbol),
+        )
+        states[symbol] = {
+            "symbol": symbol,
+            **result,
+            "alerts": alerts
+        }
+
+    # ---- update state
+    with timed(STAGE_METRIC, stage="state"):
+        update_states(states)
+
+    published = time.time()
+    for symbol, closed in closed_bars.items():
+        # the first publish after boot isn't tied to a fresh close
+        if closed is not None and symbol in last_closed_bars:
+            latency = published - (closed + INTERVAL_MS[BAR_INTERVAL]) / 1000
+            close_to_publish.append(latency)
+            observe(LATENCY_METRIC, latency)
+        last_closed_bars[symbol] = closed
+
+    latency = f" | close→publish median {statistics.median(close_to_publish):.2f}s" if close_to_publish else ""
+    print(f"Updated state for {len(states)} symbols{latency}")
+
+    # ---- TELEGRAM NOTIFICATIONS (IMPORTANT PART)
+
+    with timed(STAGE_METRIC, stage="notify"):
+        store = get_store()
 
-        time.sleep(SLEEP_SECONDS)
+        for symbol, state in states.items():
+            current_regime = state["current_regime"]
+            prev_regime = prev_regimes.get(symbol)
+            notify(
+                dispatcher.enqueue, store, symbol,
+                current_regime, state["confidence"],
+                prev_regime, state["alerts"],
+            )
+            prev_regimes[symbol] = current_regime
+
+    await store_history(frames)
+    return stale
+
+
+async def run_bar(fetcher: AsyncKlineFetcher, dispatcher: TelegramDispatcher):
+    # retry symbols whose new bar the exchange hadn't published yet
+    stale = await run_cycle(fetcher, dispatcher)
+    for _ in range(CLOSE_RETRY_LIMIT):
+        if not stale:
+            break
+        await asyncio.sleep(CLOSE_RETRY_SECONDS)
+        stale = await run_cycle(fetcher, dispatcher, stale)
+
+
+async def worker_loop():
+    print(f"Regime worker started (LIVE BINANCE) | symbols={len(SYMBOLS)}")
+    warm_up()
+
+    # telegram sends run in the background and never hold up the next cycle
+    async with AsyncKlineFetcher(max_concurrency=MAX_CONCURRENT_REQUESTS) as fetcher, \
+            TelegramDispatcher() as dispatcher:
+        # publish straight away on boot, then after every bar close
+        while True:
+            try:
+                with timed(STAGE_METRIC, stage="cycle"):
+                    await run_bar(fetcher, dispatcher)
+            except Exception as e:
+                print("Worker error:", e)
+
+            if METRICS_ENABLED:
+                try:
+                    registry.write()
+                except OSError as e:
+                    print("Metrics write failed:", e)
+
+            await asyncio.sleep(seconds_until_next_run())
+
+
+def run_worker():
+    asyncio.run(worker_loop())
 
 if __name__ == "__main__":
     run_worker()